@@ -0,0 +1,270 @@
+"""Benchmark offline de cada etapa do pipeline de separação.
+
+Uso (a partir de back-seek/):
+    python -m benchmarks.pipeline [--lengths 10,30,60] [--repeat 3] [--model htdemucs]
+                                  [--stages load,apply_model,...] [--format mp3]
+                                  [--output resultados.json]
+                                  [--baseline base.json] [--max-regression 0.15]
+
+Gera misturas sintéticas de cada duração (benchmarks.fixtures), grava como WAV
+e mede, sem rede:
+
+    load                _load_audio (WAV -> tensor na taxa do modelo)
+    apply_model         apply_model do Demucs sobre a faixa inteira
+    separate            AudioSeparator.separate (laço de segmentos do projeto), saída npy
+    encode              codificação dos 4 stems no formato pedido (StemEncoder)
+    refine_noisereduce  noise reduction do VocalRefiner (reduce_noise)
+    refine_dsp          cadeia highpass/lowpass/compand em memória
+    refine_ffmpeg       a mesma cadeia pelo FFmpeg (pulada se não houver FFmpeg)
+    pipeline            SeparationPipeline.run completo, com o download substituído
+                        por um arquivo local (LocalFileDownloader) e refinamento
+
+Para cada duração e etapa reporta o tempo de parede (mediana das repetições),
+o fator de tempo real (tempo / duração do áudio; < 1 é mais rápido que o tempo
+real) e o pico de RSS do processo durante a etapa (o FFmpeg roda em
+subprocesso; o pico dele vai em child_peak_rss_mb). Com --output grava JSON;
+com --baseline compara com um JSON anterior e sai com código 1 se alguma etapa
+ficar mais lenta que --max-regression (fração).
+"""
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+import torch
+import demucs
+from demucs.apply import apply_model
+
+from benchmarks.fixtures import SAMPLERATE, LocalFileDownloader, write_fixture
+from src.encoder import StemEncoder
+from src.jobs import Job
+from src.models.model_manager import ModelManager, PRECISIONS, inference_context
+from src.pipeline import SeparationPipeline
+from src.progress import ProgressBroker
+from src.separator import AudioSeparator
+from src.stems import STEM_NAMES
+from src.utils.dsp import vocal_filter_chain
+from src.utils.memory import current_rss_mb
+from src.vocal_refiner import VocalRefiner
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ['load', 'apply_model', 'separate', 'encode', 'refine_noisereduce',
+          'refine_dsp', 'refine_ffmpeg', 'pipeline']
+
+
+class RssSampler:
+    """Amostra o RSS do processo numa thread enquanto a etapa roda"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+def children_peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageRunner:
+    """Prepara modelo, separador e refinador uma vez e mede cada etapa"""
+
+    def __init__(self, model_name: str, precision: str, output_format: str,
+                 work_dir: Path, ffmpeg_path: str = None):
+        self.output_format = output_format
+        self.work_dir = work_dir
+        self.manager = ModelManager(default_model=model_name, precision=precision)
+        self.model = self.manager.get_model(model_name)
+        self.encoder = StemEncoder(workers=4)
+        self.separator = AudioSeparator(self.manager, output_dir=work_dir / 'separated', encoder=self.encoder)
+        self.refiner = VocalRefiner(ffmpeg_path)
+        self.pipeline = SeparationPipeline(LocalFileDownloader(), self.separator, self.refiner, ProgressBroker())
+        self.has_ffmpeg = bool(shutil.which('ffmpeg', path=ffmpeg_path) if ffmpeg_path else shutil.which('ffmpeg'))
+        self.separator.warm_up(model_name)
+
+    def prepare(self, wav_path: Path):
+        """Entradas das etapas derivadas da fixture (fora da medição)"""
+        wav = self.separator._load_audio(wav_path, self.model)
+        files = self.separator.separate(wav_path, output_format='npy')
+        stems = {stem: np.load(str(path)) for stem, path in files.items()}
+        vocals_path = self.work_dir / f"{wav_path.stem}_vocals.wav"
+        sf.write(str(vocals_path), stems['other'], self.model.samplerate)
+        return {'wav': wav, 'stems': stems, 'vocals': stems['other'], 'vocals_path': vocals_path}
+
+    def run(self, stage: str, wav_path: Path, inputs: dict):
+        sr = self.model.samplerate
+        if stage == 'load':
+            self.separator._load_audio(wav_path, self.model)
+        elif stage == 'apply_model':
+            device = self.manager.device
+            with torch.no_grad(), inference_context(self.model, device):
+                apply_model(self.model, inputs['wav'][None], device=device, shifts=0, split=True, overlap=0.25)
+        elif stage == 'separate':
+            self.separator.separate(wav_path, output_format='npy')
+        elif stage == 'encode':
+            futures = [self.encoder.submit(audio, sr, self.work_dir / f"enc_{stem}", self.output_format)
+                       for stem, audio in inputs['stems'].items()]
+            for future in futures:
+                future.result()
+        elif stage == 'refine_noisereduce':
+            self.refiner.reduce_noise(inputs['vocals'], sr)
+        elif stage == 'refine_dsp':
+            vocal_filter_chain(inputs['vocals'].mean(axis=1), sr)
+        elif stage == 'refine_ffmpeg':
+            if not self.refiner.refine_with_ffmpeg(inputs['vocals_path'], self.work_dir / 'ffmpeg_refined.wav'):
+                raise RuntimeError("FFmpeg falhou")
+        elif stage == 'pipeline':
+            job = Job('benchmark', {
+                'youtube_url': wav_path.resolve().as_uri(),
+                'refine_vocals': True,
+                'format': self.output_format,
+            })
+            self.pipeline.run(job)
+        else:
+            raise ValueError(f"Etapa desconhecida: {stage}")
+
+
+def measure(runner: StageRunner, stage: str, wav_path: Path, inputs: dict, seconds: float, repeat: int) -> dict:
+    times, peaks = [], []
+    for _ in range(repeat):
+        with RssSampler() as sampler:
+            start = time.perf_counter()
+            runner.run(stage, wav_path, inputs)
+            times.append(time.perf_counter() - start)
+        peaks.append(sampler.peak)
+
+    wall = statistics.median(times)
+    result = {
+        'length': seconds,
+        'stage': stage,
+        'seconds': round(wall, 4),
+        'min_seconds': round(min(times), 4),
+        'rtf': round(wall / seconds, 4),
+        'peak_rss_mb': round(max(peaks), 1),
+    }
+    if stage == 'refine_ffmpeg':
+        result['child_peak_rss_mb'] = round(children_peak_rss_mb(), 1)
+    return result
+
+
+def compare(results: list, baseline: dict, max_regression: float) -> bool:
+    """Imprime a variação em relação à base; retorna False se houver regressão"""
+    base = {(r['length'], r['stage']): r for r in baseline['results']}
+    ok = True
+    print(f"\n{'duração':>8} {'etapa':<20} {'base (s)':>9} {'atual (s)':>10} {'variação':>9}")
+    for result in results:
+        previous = base.get((result['length'], result['stage']))
+        if previous is None:
+            continue
+        change = result['seconds'] / max(previous['seconds'], 1e-9) - 1
+        flag = ''
+        if change > max_regression:
+            flag = '  REGRESSÃO'
+            ok = False
+        print(f"{result['length']:>7.0f}s {result['stage']:<20} {previous['seconds']:>9.3f} "
+              f"{result['seconds']:>10.3f} {change:>+8.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline das etapas do pipeline")
+    parser.add_argument('--lengths', default='10,30,60', help="Durações das fixtures em segundos")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--model', default='htdemucs')
+    parser.add_argument('--precision', default='fp32', choices=PRECISIONS)
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--format', default='mp3', help="Formato da etapa encode/pipeline")
+    parser.add_argument('--ffmpeg-path', default=None, help="Diretório do executável do FFmpeg")
+    parser.add_argument('--output', help="Grava os resultados em JSON")
+    parser.add_argument('--baseline', help="JSON de uma execução anterior para comparar")
+    parser.add_argument('--max-regression', type=float, default=0.15,
+                        help="Aumento de tempo tolerado em relação à base (fração)")
+    args = parser.parse_args()
+
+    lengths = [float(x) for x in args.lengths.split(',') if x.strip()]
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Etapas desconhecidas: {', '.join(sorted(unknown))}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        runner = StageRunner(args.model, args.precision, args.format, work_dir, args.ffmpeg_path)
+        if 'refine_ffmpeg' in stages and not runner.has_ffmpeg:
+            print("FFmpeg não encontrado; pulando refine_ffmpeg")
+            stages.remove('refine_ffmpeg')
+
+        print(f"{'duração':>8} {'etapa':<20} {'tempo (s)':>10} {'RTF':>7} {'pico RSS (MB)':>14}")
+        for index, seconds in enumerate(lengths):
+            wav_path = write_fixture(work_dir / f"synthetic_{seconds:g}s.wav", seconds, seed=index)
+            inputs = runner.prepare(wav_path)
+            for stage in stages:
+                result = measure(runner, stage, wav_path, inputs, seconds, args.repeat)
+                results.append(result)
+                print(f"{seconds:>7.0f}s {stage:<20} {result['seconds']:>10.3f} "
+                      f"{result['rtf']:>7.3f} {result['peak_rss_mb']:>14.0f}")
+
+    report = {
+        'meta': {
+            'model': args.model,
+            'precision': args.precision,
+            'format': args.format,
+            'device': runner.manager.device,
+            'repeat': args.repeat,
+            'samplerate': SAMPLERATE,
+            'stems': STEM_NAMES,
+            'torch': torch.__version__,
+            'demucs': getattr(demucs, '__version__', None),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'torch_threads': torch.get_num_threads(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nResultados gravados em {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if not compare(results, baseline, args.max_regression):
+            print(f"FALHOU: etapa(s) mais de {args.max_regression:.0%} mais lenta(s) que a base")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Qualidade e velocidade de cada precisão de inferência (fp32, bf16, int8).
+
+Uso (a partir de back-seek/):
+    python -m benchmarks.precision [--model htdemucs] [--precisions fp32,bf16,int8]
+                                  [--min-sdr 25] [arquivos de áudio...]
+
+Separa as fixtures (ou os arquivos dados) em cada modo e reporta o fator de
+tempo real (tempo de separação / duração do áudio; < 1 é mais rápido que o
+tempo real) e o SDR de cada stem em relação à saída fp32. Com --min-sdr, sai
+com código 1 se algum modo ficar abaixo do limite.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.fixtures import load_fixtures
+from src.encoder import StemEncoder
+from src.models.model_manager import ModelManager, PRECISIONS
+from src.separator import AudioSeparator
+
+
+def sdr_db(reference: np.ndarray, estimate: np.ndarray) -> float:
+    error = np.sum((reference - estimate) ** 2)
+    return float(10 * np.log10(np.sum(reference ** 2) / max(error, 1e-20) + 1e-20))
+
+
+def run_mode(model_name: str, precision: str, fixtures, output_dir: Path):
+    """Separa todas as fixtures no modo dado; retorna {fixture: (segundos, {stem: array})}"""
+    manager = ModelManager(default_model=model_name, precision=precision)
+    separator = AudioSeparator(manager, output_dir=output_dir, encoder=StemEncoder(workers=1))
+    separator.warm_up(model_name)
+
+    results = {}
+    for name, audio in fixtures.items():
+        start = time.time()
+        files = separator.separate(audio, output_format='npy', model_name=model_name)
+        elapsed = time.time() - start
+        results[name] = (elapsed, {stem: np.load(str(path)) for stem, path in files.items()})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara as precisões de inferência")
+    parser.add_argument('files', nargs='*', help="Arquivos de áudio (padrão: fixtures sintéticas)")
+    parser.add_argument('--model', default='htdemucs')
+    parser.add_argument('--precisions', default=','.join(PRECISIONS))
+    parser.add_argument('--min-sdr', type=float, default=None, help="SDR mínimo (dB) em relação ao fp32")
+    args = parser.parse_args()
+
+    precisions = [p.strip() for p in args.precisions.split(',') if p.strip()]
+    if 'fp32' not in precisions:
+        precisions.insert(0, 'fp32')
+    fixtures = load_fixtures(args.files)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {p: run_mode(args.model, p, fixtures, Path(tmp) / p) for p in precisions}
+
+    failed = False
+    print(f"{'modo':<6} {'fixture':<16} {'RTF':>7} {'SDR médio':>10} {'SDR mínimo':>11}")
+    for precision in precisions:
+        for name, audio in fixtures.items():
+            elapsed, stems = results[precision][name]
+            reference = results['fp32'][name][1]
+            rtf = elapsed / audio.duration
+            if precision == 'fp32':
+                print(f"{precision:<6} {name:<16} {rtf:>7.3f} {'-':>10} {'-':>11}")
+                continue
+            sdrs = [sdr_db(reference[stem], stems[stem]) for stem in reference]
+            print(f"{precision:<6} {name:<16} {rtf:>7.3f} {np.mean(sdrs):>10.2f} {min(sdrs):>11.2f}")
+            if args.min_sdr is not None and min(sdrs) < args.min_sdr:
+                failed = True
+
+    if failed:
+        print(f"FALHOU: SDR abaixo de {args.min_sdr} dB")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
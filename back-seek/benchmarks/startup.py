@@ -0,0 +1,79 @@
+"""Mede o tempo de inicialização do servidor e até a primeira separação.
+
+Uso (a partir de back-seek/):
+    python -m benchmarks.startup [--youtube-url URL] [--port 5000]
+
+Inicia `python main.py`, mede quando /api/health passa a responder (HTTP no
+ar), quando /api/ready retorna 200 (modelos carregados e aquecidos) e, com
+--youtube-url, quanto tempo leva até a primeira separação concluída.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import requests
+
+
+def wait_for(url: str, deadline: float, status: int = None) -> float:
+    """Espera a URL responder (com o status dado, se houver); retorna o instante"""
+    while time.time() < deadline:
+        try:
+            response = requests.get(url, timeout=1)
+            if status is None or response.status_code == status:
+                return time.time()
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"Sem resposta de {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização do servidor")
+    parser.add_argument('--youtube-url', help="Separa esta URL após ficar pronto")
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    start = time.time()
+    help_run = subprocess.run([sys.executable, 'main.py', '--help'], cwd=root, capture_output=True)
+    help_time = time.time() - start
+
+    start = time.time()
+    server = subprocess.Popen([sys.executable, 'main.py'], cwd=root,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              start_new_session=True)
+    try:
+        deadline = start + args.timeout
+        http_up = wait_for(f"{base}/api/health", deadline) - start
+        ready_at = wait_for(f"{base}/api/ready", deadline, status=200) - start
+        timings = requests.get(f"{base}/api/ready").json().get('timings')
+
+        print(f"CLI --help: {help_time:.2f}s (código {help_run.returncode})")
+        print(f"HTTP no ar (/api/health): {http_up:.2f}s")
+        print(f"Pronto (/api/ready): {ready_at:.2f}s")
+        print(f"Etapas: {timings}")
+
+        if args.youtube_url:
+            response = requests.post(f"{base}/api/separate", json={'youtube_url': args.youtube_url})
+            response.raise_for_status()
+            status_url = base + response.json()['status_url']
+            while True:
+                job = requests.get(status_url).json()
+                if job['status'] in ('completed', 'failed'):
+                    break
+                time.sleep(0.5)
+            print(f"Primeira separação ({job['status']}): {time.time() - start:.2f}s após o início")
+    finally:
+        # O reloader do modo debug cria um processo filho: encerra o grupo todo
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,33 @@
+import time
+
+# Marca o início do processo para medir o tempo de inicialização
+_PROCESS_STARTED_AT = time.time()
+
 import argparse
+import json
+import os
+import threading
 from pathlib import Path
-from time import sleep
-from threading import Thread
-from flask import Flask, request, jsonify, send_file, Response, stream_with_context
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 
-from src.downloader import YouTubeDownloader
-from src.separator import AudioSeparator
-from src.vocal_refiner import VocalRefiner
-from src.models.model_manager import ModelManager
+# Apenas módulos leves aqui; torch, demucs, yt_dlp e noisereduce são
+# importados por init_services(), em segundo plano no servidor
 from src.utils.logger import setup_logger
 from src.utils.file_utils import safe_filename
+from src.file_index import FileIndex, download_response
+from src.jobs import Job, JobQueue, QueueFullError, validate_job_id
+from src.progress import ProgressBroker
+from src.stems import STEM_NAMES, SIX_STEM_EXTRA, validate_stems
+from src.streaming import StemStream
+from src.utils.memory import current_rss_mb
+from src import metrics
+from src import config
 
 app = Flask(__name__)
 
-# Progresso por jobId
-PROGRESS = {}
+# Progresso por jobId (push para os assinantes SSE)
+progress_broker = ProgressBroker(ttl=config.PROGRESS_TTL, keepalive=config.SSE_KEEPALIVE)
 
 # CORS (ajuste as origens conforme seu front)
 CORS(
@@ -28,155 +40,553 @@ CORS(
 
 logger = setup_logger(__name__)
 
-model_manager = ModelManager()
-downloader = YouTubeDownloader()
-separator = AudioSeparator(model_manager)
-vocal_refiner = VocalRefiner()
-
-try:
-    model_manager.load_model()
-    logger.info("Aplicação inicializada com sucesso!")
-except Exception as e:
-    logger.error(f"Falha ao inicializar aplicação: {e}")
-    exit(1)
+# Serviços criados por init_services()
+model_manager = None
+downloader = None
+batch_engine = None
+stem_encoder = None
+separator = None
+vocal_refiner = None
+result_cache = None
+window_cache = None
+storage = None
+pipeline = None
+
+# Estado da inicialização, exposto em /api/ready
+ready = threading.Event()
+startup = {
+    'stage': 'starting',
+    'error': None,
+    'timings': {},
+    'first_separation_seconds': None,
+}
+
+def init_services():
+    """Importa os módulos pesados e cria os serviços (sem carregar modelos)"""
+    global model_manager, downloader, batch_engine, stem_encoder, separator
+    global vocal_refiner, result_cache, window_cache, storage, pipeline
+
+    from src.downloader import YouTubeDownloader
+    from src.separator import AudioSeparator
+    from src.vocal_refiner import VocalRefiner
+    from src.models.model_manager import ModelManager
+    from src.pipeline import SeparationPipeline
+    from src.cache import ResultCache
+    from src.window_cache import WindowCache
+    from src.storage import StorageManager
+    from src.inference import BatchInferenceEngine
+    from src.process_pool import ProcessInferencePool
+    from src.encoder import StemEncoder
+
+    model_manager = ModelManager(
+        default_model=config.DEFAULT_MODEL,
+        memory_budget_mb=config.MODEL_MEMORY_BUDGET_MB,
+        available_models=config.AVAILABLE_MODELS,
+        precision=config.INFERENCE_PRECISION,
+    )
+    downloader = YouTubeDownloader()
+    use_processes = config.PROCESS_WORKERS > 0 and model_manager.device == 'cpu'
+    if use_processes and model_manager.precision == 'int8':
+        # Modelos com quantização dinâmica não podem ser enviados aos processos (spawn)
+        logger.warning("PROCESS_WORKERS ignorado com INFERENCE_PRECISION=int8; "
+                       "usando inferência no próprio processo")
+        use_processes = False
+    if use_processes:
+        # Vários processos com uma única cópia dos pesos em memória compartilhada
+        batch_engine = ProcessInferencePool(
+            config.PROCESS_WORKERS,
+            threads_per_worker=config.THREADS_PER_WORKER,
+            model_manager=model_manager,
+        )
+    elif config.BATCH_INFERENCE:
+        batch_engine = BatchInferenceEngine(
+            model_manager.device,
+            max_batch=config.BATCH_MAX_SIZE,
+            window_ms=config.BATCH_WINDOW_MS,
+        )
+    stem_encoder = StemEncoder(workers=config.ENCODER_WORKERS)
+    if config.WINDOW_CACHE_MAX_MB > 0:
+        window_cache = WindowCache(Path(config.WINDOW_CACHE_DIR), max_bytes=config.WINDOW_CACHE_MAX_MB * 1024 * 1024)
+    separator = AudioSeparator(
+        model_manager,
+        batch_engine=batch_engine,
+        encoder=stem_encoder,
+        inference_slots=config.INFERENCE_SLOTS,
+        window_cache=window_cache,
+        window_seconds=config.WINDOW_SECONDS,
+        context_seconds=config.RANGE_CONTEXT_SECONDS,
+    )
+    vocal_refiner = VocalRefiner()
+    result_cache = ResultCache(Path(config.RESULT_CACHE_DIR), max_bytes=config.RESULT_CACHE_MAX_MB * 1024 * 1024)
+    storage = StorageManager(
+        Path(config.WORKSPACE_DIR),
+        max_bytes=config.STORAGE_MAX_MB * 1024 * 1024,
+        interval=config.STORAGE_EVICT_INTERVAL,
+    )
+    pipeline = SeparationPipeline(downloader, separator, vocal_refiner, progress_broker,
+                                  cache=result_cache, storage=storage)
+
+def warm_up():
+    """Inicializa os serviços, carrega os modelos e faz um forward de aquecimento.
+
+    Roda em uma thread em segundo plano; /api/ready responde 200 ao terminar.
+    """
+    timings = startup['timings']
+    timings['imports_before_warmup'] = round(time.time() - _PROCESS_STARTED_AT, 2)
+    try:
+        startup['stage'] = 'imports'
+        step = time.time()
+        init_services()
+        timings['services'] = round(time.time() - step, 2)
+
+        # Os demais modelos são carregados no primeiro pedido que os usar
+        startup['stage'] = 'models'
+        step = time.time()
+        model_manager.prewarm(config.PREWARM_MODELS)
+        timings['models'] = round(time.time() - step, 2)
+
+        if config.WARMUP_FORWARD:
+            startup['stage'] = 'warmup'
+            step = time.time()
+            for model_name in config.PREWARM_MODELS:
+                separator.warm_up(model_name)
+            timings['warmup'] = round(time.time() - step, 2)
+
+        timings['ready'] = round(time.time() - _PROCESS_STARTED_AT, 2)
+        startup['stage'] = 'ready'
+        ready.set()
+        logger.info(f"Aplicação pronta em {timings['ready']:.2f}s: {timings}")
+    except Exception as e:
+        startup['stage'] = 'failed'
+        startup['error'] = str(e)
+        logger.error(f"Falha ao inicializar aplicação: {e}")
+
+def start_warm_up():
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def not_ready_response():
+    """Resposta 503 enquanto os serviços não estão prontos (None se prontos)"""
+    if ready.is_set():
+        return None
+    response = jsonify({'error': 'Serviço inicializando', 'stage': startup['stage'], 'detail': startup['error']})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def _run_job(job):
+    return pipeline.run(job)
+
+def _on_job_finished(job):
+    # Garante o fim da SSE, inclusive em caso de erro
+    progress_broker.finish(job.id, job.status, job.error)
+    if job.status == Job.COMPLETED:
+        file_index.register_result(job.result)
+    # Tempo até a primeira separação concluída após o início do processo
+    if job.status == Job.COMPLETED and startup['first_separation_seconds'] is None:
+        startup['first_separation_seconds'] = round(time.time() - _PROCESS_STARTED_AT, 2)
+        logger.info(f"Primeira separação concluída {startup['first_separation_seconds']:.2f}s após o início")
+
+# Criados por create_runtime(): os processos do pool de inferência reimportam
+# este módulo (como __mp_main__) e não devem ter fila, workers nem índice próprios
+file_index = None
+job_queue = None
+
+def _cancel_abandoned_job(job_id):
+    # O último assinante do progresso saiu: cancela se ninguém reconectar na tolerância
+    def check():
+        job = job_queue.get(job_id)
+        if job is None or job.finished or progress_broker.subscribers(job_id):
+            return
+        # Pedidos anexados podem estar acompanhando por /api/jobs/<id>, sem SSE
+        if job.attached > 0:
+            logger.info(f"[{job_id}] Sem assinantes do progresso, mas com {job.attached} pedido(s) anexado(s); mantendo")
+            return
+        logger.info(f"[{job_id}] Sem assinantes do progresso há {config.CANCEL_GRACE_SECONDS}s, cancelando")
+        job_queue.cancel(job_id, detach=False)
+
+    timer = threading.Timer(config.CANCEL_GRACE_SECONDS, check)
+    timer.daemon = True
+    timer.start()
+
+def _jobs_in_flight():
+    if job_queue is None:
+        return {}
+    counts = job_queue.stats()
+    return {(Job.QUEUED,): counts[Job.QUEUED], (Job.RUNNING,): counts[Job.RUNNING]}
+
+def _model_memory():
+    if model_manager is None:
+        return {}
+    return {(name,): size for name, size in model_manager.memory_usage().items()}
+
+metrics.JOBS_IN_FLIGHT.set_function(_jobs_in_flight)
+metrics.MODEL_MEMORY_BYTES.set_function(_model_memory)
+metrics.PROCESS_RSS_BYTES.set_function(lambda: current_rss_mb() * 1024 * 1024)
+
+def _batch_stat(field, scale=1):
+    # Campo de batch_engine.stats(); sem amostra se o motor não existe ou não tem o campo
+    def collect():
+        stats = batch_engine.stats() if batch_engine is not None else {}
+        return {(): stats[field] * scale} if stats.get(field) is not None else {}
+    return collect
+
+metrics.BATCH_MAX_SIZE.set_function(_batch_stat('max_batch'))
+metrics.BATCH_WINDOW_SECONDS.set_function(_batch_stat('window_ms', 0.001))
+metrics.BATCH_AVERAGE_SIZE.set_function(_batch_stat('avg_batch_size'))
+metrics.BATCH_IN_FLIGHT.set_function(_batch_stat('in_flight'))
+metrics.BATCHES_TOTAL.set_function(_batch_stat('batches'))
+metrics.BATCH_SEGMENTS_TOTAL.set_function(_batch_stat('segments'))
+metrics.BATCH_BUSY_SECONDS.set_function(_batch_stat('busy_seconds'))
+
+def create_runtime():
+    """Cria a fila de trabalhos (com seus workers) e o índice de downloads.
+
+    Chamado só no processo que serve a API, nunca nos processos do pool.
+    """
+    global file_index, job_queue
+    if job_queue is not None:
+        return
+    # Arquivos servidos por /api/download, na ordem de prioridade dos diretórios
+    file_index = FileIndex(['downloads', 'separated', config.RESULT_CACHE_DIR, config.WORKSPACE_DIR])
+    job_queue = JobQueue(
+        _run_job,
+        num_workers=config.SEPARATION_WORKERS,
+        max_queued=config.JOB_QUEUE_SIZE,
+        job_ttl=config.JOB_TTL,
+        on_finish=_on_job_finished,
+    )
+    if config.CANCEL_ON_DISCONNECT:
+        progress_broker.on_abandoned = _cancel_abandoned_job
 
 # ------------------------------------------------------------
-# Health
+# Health (liveness) e prontidão (readiness)
+# GET /api/health  -> o processo está vivo (503 se a inicialização falhou)
+# GET /api/ready   -> 200 apenas após carregar e aquecer os modelos
 # ------------------------------------------------------------
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    if not ready.is_set():
+        status = 'unhealthy' if startup['stage'] == 'failed' else 'starting'
+        return jsonify({
+            'status': status,
+            'ready': False,
+            'stage': startup['stage'],
+            'error': startup['error'],
+            'jobs': job_queue.stats(),
+        }), 503 if status == 'unhealthy' else 200
+
     return jsonify({
         'status': 'healthy',
+        'ready': True,
         'device': model_manager.device,
-        'model_loaded': model_manager.model is not None
+        'model_loaded': model_manager.model is not None,
+        'models': model_manager.stats(),
+        'jobs': job_queue.stats(),
+        'cache': result_cache.stats(),
+        'window_cache': window_cache.stats() if window_cache else None,
+        'storage': storage.stats(),
+        'batching': batch_engine.stats() if batch_engine else None,
+        'encoder': stem_encoder.stats()
     })
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    body = {
+        'ready': ready.is_set(),
+        'stage': startup['stage'],
+        'error': startup['error'],
+        'uptime_seconds': round(time.time() - _PROCESS_STARTED_AT, 2),
+        'timings': startup['timings'],
+        'first_separation_seconds': startup['first_separation_seconds'],
+    }
+    return jsonify(body), 200 if ready.is_set() else 503
+
+# ------------------------------------------------------------
+# Métricas (formato de texto do Prometheus)
+# GET /api/metrics -> histogramas por etapa, contadores e gauges
+# ------------------------------------------------------------
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ------------------------------------------------------------
 # SSE de progresso
 # GET /api/progress/<job_id>
 # ------------------------------------------------------------
 @app.route("/api/progress/<job_id>")
 def progress(job_id):
+    # Pedidos anexados a outro trabalho acompanham o progresso dele
+    job = job_queue.get(job_id)
+    if job is not None:
+        job_id = job.id
+
+    # Reconexões retomam a partir do último evento recebido
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+
     def gen():
-        last = -1
-        while True:
-            p = PROGRESS.get(job_id, 0)
-            if p != last:
-                # Envia tanto o valor numérico quanto um objeto JSON
-                yield f"data: {p}\n\n"
-                yield f"event: progress\ndata: {{\"percent\": {p}}}\n\n"
-                last = p
-            if p >= 100:
-                yield "event: complete\ndata: {\"status\": \"completed\"}\n\n"
-                break
-            sleep(0.4)
-        # Limpa o progresso após completar
-        if job_id in PROGRESS:
-            del PROGRESS[job_id]
-    return Response(stream_with_context(gen()), mimetype="text/event-stream")
+        for event in progress_broker.subscribe(job_id, last_event_id):
+            if event is None:
+                # Mantém a conexão viva enquanto não há novidades
+                yield ": keepalive\n\n"
+                continue
+
+            p = event['percent']
+            # Envia tanto o valor numérico quanto um objeto JSON
+            yield f"id: {event['id']}\ndata: {p}\n\n"
+            yield f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+            if event['finished']:
+                yield f"event: complete\ndata: {json.dumps({'status': event['status'], 'error': event['error']})}\n\n"
+
+    return Response(
+        stream_with_context(gen()),
+        mimetype="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 # ------------------------------------------------------------
-# Separação principal
+# Separação principal (assíncrona)
 # POST /api/separate
-# body: { youtube_url: string, refine_vocals?: bool, jobId?: string }
+# body: { youtube_url: string, refine_vocals?: bool, jobId?: string,
+#         stems?: string[], two_stems?: string, keep_wav?: bool,
+#         format?: 'mp3'|'flac'|'opus'|'npy', bitrate?: int (kbps),
+#         model?: string, start?: number, end?: number, preview?: bool }
+# `start`/`end` (segundos) separam só esse trecho da faixa
+# Com `preview`, uma prévia rápida (início do pedido, uma passada) sai antes
+# no progresso e em /api/jobs/<id>; a separação completa a substitui ao terminar
+# Sem `format`, o formato vem do header Accept (audio/mpeg, audio/flac,
+# audio/ogg) ou do padrão OUTPUT_FORMAT
+# Enfileira o trabalho e retorna 202 com o jobId imediatamente
 # ------------------------------------------------------------
+_ACCEPT_FORMATS = {
+    'audio/mpeg': 'mp3',
+    'audio/flac': 'flac',
+    'audio/ogg': 'opus',
+    'audio/opus': 'opus',
+}
+
+def negotiate_format(data):
+    """Formato de saída pedido no corpo, ou o primeiro aceito pelo header Accept"""
+    if data.get('format'):
+        return data['format']
+    for mimetype, _ in request.accept_mimetypes:
+        if mimetype in _ACCEPT_FORMATS:
+            return _ACCEPT_FORMATS[mimetype]
+    return config.OUTPUT_FORMAT
+
+def separation_params(data):
+    """Opções de processamento do corpo do pedido (ValueError se inválidas)"""
+    stems = data.get('stems')
+    two_stems = data.get('two_stems')
+    if stems is not None and (not isinstance(stems, list) or not stems):
+        raise ValueError('stems deve ser uma lista não vazia')
+    output_format = negotiate_format(data)
+    bitrate = data.get('bitrate')
+    model_name = data.get('model')
+    model_manager.validate_model(model_name)
+    validate_stems(stems, two_stems, model_name)
+    stem_encoder.validate_format(output_format, bitrate)
+    start, end = separator.validate_range(data.get('start'), data.get('end'))
+    return {
+        'refine_vocals': bool(data.get('refine_vocals', False)),
+        'stems': stems,
+        'two_stems': two_stems,
+        'keep_wav': bool(data.get('keep_wav', config.KEEP_DECODED_WAV)),
+        'format': output_format,
+        'bitrate': bitrate,
+        'model': model_name,
+        'start': start,
+        'end': end,
+        'preview': bool(data.get('preview', False)),
+    }
+
+def job_links(job, created=True):
+    return {
+        'jobId': job.id,
+        'status': job.status,
+        'status_url': f'/api/jobs/{job.id}',
+        'result_url': f'/api/jobs/{job.id}/result',
+        'progress_url': f'/api/progress/{job.id}',
+        'cancel_url': f'/api/jobs/{job.id}/cancel',
+        'deduplicated': not created,
+    }
+
 @app.route('/api/separate', methods=['POST'])
 def separate_audio():
+    unavailable = not_ready_response()
+    if unavailable:
+        return unavailable
     try:
         data = request.json or {}
         youtube_url = data.get('youtube_url')
-        refine = bool(data.get('refine_vocals', False))
-        job_id = data.get('jobId', 'default')
+        job_id = data.get('jobId')
 
         if not youtube_url:
             return jsonify({'error': 'URL do YouTube não fornecida'}), 400
 
-        # Inicializa o progresso
-        if job_id:
-            PROGRESS[job_id] = 0
-
-        logger.info(f"[{job_id}] Baixando áudio… URL: {youtube_url}")
-        
-        # Função para atualizar progresso durante o download
-        def download_progress_hook(progress):
-            if job_id:
-                # Mapeia o progresso do download (0-100) para 0-30 do progresso total
-                PROGRESS[job_id] = progress * 0.3
-                logger.info(f"[{job_id}] Progresso do download: {progress}%")
-        
-        audio_file = downloader.download_audio(youtube_url, progress_callback=download_progress_hook)
-        if not audio_file:
-            if job_id:
-                PROGRESS[job_id] = 100
-            return jsonify({'error': 'Falha ao baixar áudio do YouTube'}), 500
-
-        # Atualiza progresso após download
-        if job_id:
-            PROGRESS[job_id] = 30
-
-        logger.info(f"[{job_id}] Separando stems…")
-
-        # Função para atualizar progresso durante a separação
-        def separation_progress_hook(demucs_progress):
-            if job_id:
-                # O progresso do Demucs já está em 0-100%, mapeamos para 30-80% do progresso total
-                total_progress = 30 + (demucs_progress * 0.5)
-                PROGRESS[job_id] = total_progress
-                logger.info(f"[{job_id}] Progresso do Demucs: {demucs_progress}% -> Progresso total: {total_progress:.1f}%")
-
-        separated_files = separator.separate(audio_file, progress_callback=separation_progress_hook)
-
-        if job_id:
-            PROGRESS[job_id] = 80
-
-        # No seu pipeline, 'other' é a faixa de voz
-        vocals_path = Path(separated_files['other'])
-
-        if refine:
-            logger.info(f"[{job_id}] Refinando vocais…")
-            
-            # Função para atualizar progresso durante o refinamento
-            def refinement_progress_hook(progress):
-                if job_id:
-                    # Mapeia o progresso do refinamento (0-100) para 80-100 do progresso total
-                    PROGRESS[job_id] = 80 + (progress * 0.2)
-                    logger.info(f"[{job_id}] Progresso do refinamento: {progress}%")
-            
-            refined_vocals = vocal_refiner.full_refinement_pipeline(
-                vocals_path, 
-                progress_callback=refinement_progress_hook
-            )
-            separated_files['vocals_refined'] = refined_vocals
-            vocals_display = str(refined_vocals)
-        else:
-            vocals_display = str(vocals_path)
+        try:
+            validate_job_id(job_id)
+            params = {'youtube_url': youtube_url, **separation_params(data)}
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Pedidos idênticos em andamento são anexados ao mesmo trabalho
+        job, created = job_queue.submit(params, job_id=job_id, dedup_key=pipeline.dedup_key(params))
+        if not created and params['preview'] and not job.params.get('preview'):
+            # Anexado a um trabalho sem prévia: liga a prévia nele (vale se a
+            # separação ainda não começou; depois disso o resultado completo vem antes)
+            job.params['preview'] = True
+
+        return jsonify(job_links(job, created)), 202
+
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar separação: {e}")
+        return jsonify({'error': str(e)}), 500
 
-        if job_id:
-            PROGRESS[job_id] = 100
+# ------------------------------------------------------------
+# Lote / playlist
+# POST /api/batch {"urls": [...], "playlist_url": "...", ...opções de /api/separate}
+# Um único trabalho: o próximo item é baixado enquanto o atual é separado;
+# o progresso (SSE) traz o estado de cada item em details.items
+# ------------------------------------------------------------
+@app.route('/api/batch', methods=['POST'])
+def separate_batch():
+    unavailable = not_ready_response()
+    if unavailable:
+        return unavailable
+    try:
+        data = request.json or {}
+        urls = data.get('urls') or []
+        playlist_url = data.get('playlist_url')
 
-        response = {
-            'original': str(audio_file),
-            'separated': {k: str(v) for k, v in separated_files.items()},
-            'vocals': vocals_display,
-            'instrumental': str(separated_files.get('drums', ''))
-        }
-        return jsonify(response)
+        if not isinstance(urls, list) or not all(isinstance(url, str) and url for url in urls):
+            return jsonify({'error': 'urls deve ser uma lista de URLs'}), 400
+        if not urls and not playlist_url:
+            return jsonify({'error': 'Informe urls ou playlist_url'}), 400
+        if len(urls) > config.MAX_BATCH_URLS:
+            return jsonify({'error': f'Máximo de {config.MAX_BATCH_URLS} URLs por lote'}), 400
 
-    except Exception as e:
-        logger.error(f"Erro no processamento: {e}")
-        # Garante o fim da SSE
         try:
-            if 'job_id' in locals() and job_id:
-                PROGRESS[job_id] = 100
-        except Exception:
-            pass
+            validate_job_id(data.get('jobId'))
+            params = {'urls': urls, 'playlist_url': playlist_url, **separation_params(data)}
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        job, created = job_queue.submit(params, job_id=data.get('jobId'))
+        return jsonify(job_links(job, created)), 202
+
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar lote: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ------------------------------------------------------------
+# Separação em streaming
+# GET /api/stream?youtube_url=...&stem=other&model=htdemucs
+# Responde com WAV em chunks; cada segmento é enviado assim que fica pronto
+# ------------------------------------------------------------
+@app.route('/api/stream', methods=['GET'])
+def stream_stem():
+    unavailable = not_ready_response()
+    if unavailable:
+        return unavailable
+    youtube_url = request.args.get('youtube_url')
+    stem = request.args.get('stem', 'other')
+    model_name = request.args.get('model')
+
+    if not youtube_url:
+        return jsonify({'error': 'URL do YouTube não fornecida'}), 400
+    two_stems = stem[3:] if stem.startswith('no_') else None
+    try:
+        validate_job_id(request.args.get('jobId'))
+        model_manager.validate_model(model_name)
+        validate_stems(None if two_stems else [stem], two_stems, model_name)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    stream = StemStream(
+        model_manager.get_model(model_name).samplerate,
+        max_pending=config.STREAM_MAX_PENDING,
+        timeout=config.STREAM_CLIENT_TIMEOUT,
+    )
+    try:
+        job, _ = job_queue.submit({'youtube_url': youtube_url, 'stem': stem, 'stream': stream, 'model': model_name},
+                                  job_id=request.args.get('jobId'))
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+
+    return Response(
+        stream.iter_bytes(),
+        mimetype='audio/wav',
+        headers={'X-Job-Id': job.id, 'Cache-Control': 'no-cache'},
+    )
+
+# ------------------------------------------------------------
+# Status e resultado dos trabalhos
+# GET /api/jobs/<job_id>
+# GET /api/jobs/<job_id>/result
+# POST /api/jobs/<job_id>/cancel
+# ------------------------------------------------------------
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabalho não encontrado'}), 404
+
+    status = job.to_dict()
+    if job.preview is not None:
+        file_index.register_result(job.preview)
+    snapshot = progress_broker.get(job.id)
+    status['progress'] = snapshot['percent'] if snapshot else (100 if job.finished else 0)
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabalho não encontrado'}), 404
+
+    if job.status == Job.FAILED:
+        return jsonify({'jobId': job_id, 'status': job.status, 'error': job.error}), 500
+    if job.status == Job.CANCELLED:
+        return jsonify({'jobId': job_id, 'status': job.status}), 409
+    if job.status != Job.COMPLETED:
+        # Enquanto a separação completa roda, devolve a prévia (se houver)
+        if job.preview is not None:
+            file_index.register_result(job.preview)
+        return jsonify({'jobId': job_id, 'status': job.status, 'preview': job.preview}), 202
+
+    return jsonify(job.result)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabalho não encontrado'}), 404
+    if job.finished:
+        return jsonify({'jobId': job.id, 'status': job.status, 'error': 'Trabalho já finalizado'}), 409
+
+    # Pedidos anexados apenas se desanexam; o trabalho segue para os demais
+    job = job_queue.cancel(job_id)
+    return jsonify(job.to_dict()), 202
+
 # ------------------------------------------------------------
 # Refinamento posterior (opcional)
 # ------------------------------------------------------------
 @app.route('/api/refine', methods=['POST'])
 def refine_vocals():
+    unavailable = not_ready_response()
+    if unavailable:
+        return unavailable
     try:
         data = request.json or {}
         vocals_path = data.get('vocals_path')
@@ -187,12 +597,12 @@ def refine_vocals():
 
         # Inicializa o progresso
         if job_id:
-            PROGRESS[job_id] = 0
+            progress_broker.publish(job_id, 0, stage='refinement')
             
         # Função para atualizar progresso durante o refinamento
         def refinement_progress_hook(progress):
             if job_id:
-                PROGRESS[job_id] = progress
+                progress_broker.publish(job_id, progress)
                 logger.info(f"[{job_id}] Progresso do refinamento: {progress}%")
 
         refined_path = vocal_refiner.full_refinement_pipeline(
@@ -201,7 +611,8 @@ def refine_vocals():
         )
         
         if job_id:
-            PROGRESS[job_id] = 100
+            progress_broker.finish(job_id)
+        file_index.register(refined_path)
             
         return jsonify({
             'original': vocals_path,
@@ -214,7 +625,7 @@ def refine_vocals():
         # Garante o fim da SSE
         try:
             if 'job_id' in locals() and job_id:
-                PROGRESS[job_id] = 100
+                progress_broker.finish(job_id, 'failed', str(e))
         except Exception:
             pass
         return jsonify({'error': str(e)}), 500
@@ -222,24 +633,19 @@ def refine_vocals():
 # ------------------------------------------------------------
 # Download por nome de arquivo
 # GET /api/download/<filename>
+# Suporta Range (206), If-None-Match/If-Modified-Since (304) e If-Range com
+# ETag forte. Com DOWNLOAD_ACCEL_PREFIX, o nginx envia o arquivo (X-Accel-Redirect)
 # ------------------------------------------------------------
-@app.route('/api/download/<path:filename>', methods=['GET'])
+@app.route('/api/download/<path:filename>', methods=['GET', 'HEAD'])
 def download_file(filename):
     try:
-        safe_name = safe_filename(filename)
-        file_path = Path(safe_name)
-
-        if not file_path.exists():
-            for subdir in ['downloads', 'separated']:
-                potential_path = Path(subdir) / safe_name
-                if potential_path.exists():
-                    file_path = potential_path
-                    break
-
-            if not file_path.exists():
-                return jsonify({'error': 'Arquivo não encontrado'}), 404
-
-        return send_file(file_path, as_attachment=True)
+        entry = file_index.resolve(safe_filename(filename))
+        if entry is None:
+            return jsonify({'error': 'Arquivo não encontrado'}), 404
+        if storage is not None:
+            storage.touch(entry.path)
+        return download_response(entry, max_age=config.DOWNLOAD_MAX_AGE,
+                                 accel_prefix=config.DOWNLOAD_ACCEL_PREFIX)
 
     except Exception as e:
         logger.error(f"Erro no download: {e}")
@@ -250,8 +656,7 @@ def download_file(filename):
 # ------------------------------------------------------------
 @app.route('/api/clear-progress', methods=['POST'])
 def clear_progress():
-    global PROGRESS
-    PROGRESS = {}
+    progress_broker.clear()
     return jsonify({'status': 'progress cleared'})
 
 # ------------------------------------------------------------
@@ -259,24 +664,61 @@ def clear_progress():
 # ------------------------------------------------------------
 def cli_handler():
     parser = argparse.ArgumentParser(description='Separar áudio do YouTube usando Demucs')
-    parser.add_argument('youtube_url', help='URL do vídeo do YouTube')
+    parser.add_argument('youtube_url', nargs='*', help='URL(s) do YouTube; com mais de uma, processa em lote')
+    parser.add_argument('--urls-file', help='Arquivo com uma URL por linha (lote)')
+    parser.add_argument('--playlist', help='URL de uma playlist (lote)')
     parser.add_argument('--output', '-o', default='separated', help='Diretório de saída')
     parser.add_argument('--refine', '-r', action='store_true', help='Refinar vocais')
+    parser.add_argument('--stems', '-s', help='Stems a gravar, separados por vírgula (ex.: other,drums)')
+    parser.add_argument('--model', '-m', default=config.DEFAULT_MODEL, help='Modelo Demucs (ex.: htdemucs, htdemucs_ft, htdemucs_6s)')
+    parser.add_argument('--two-stems', choices=STEM_NAMES + SIX_STEM_EXTRA, help='Grava apenas o stem alvo e o acompanhamento (no_<stem>)')
+    parser.add_argument('--format', '-f', default=config.OUTPUT_FORMAT, help='Formato dos stems: mp3, flac, opus ou npy')
+    parser.add_argument('--bitrate', '-b', type=int, help='Bitrate em kbps (mp3/opus)')
+    parser.add_argument('--start', type=float, help='Início do trecho a separar (segundos)')
+    parser.add_argument('--end', type=float, help='Fim do trecho a separar (segundos)')
     args = parser.parse_args()
 
+    urls = list(args.youtube_url)
+    if args.urls_file:
+        with open(args.urls_file, encoding='utf-8') as urls_file:
+            urls.extend(line.strip() for line in urls_file if line.strip() and not line.startswith('#'))
+    if not urls and not args.playlist:
+        parser.error('informe uma URL, --urls-file ou --playlist')
+
+    stems = [s.strip() for s in args.stems.split(',') if s.strip()] if args.stems else None
+    # Os módulos pesados só são importados depois de validar os argumentos
+    init_services()
+    try:
+        model_manager.validate_model(args.model)
+        validate_stems(stems, args.two_stems, args.model)
+        stem_encoder.validate_format(args.format, args.bitrate)
+        start, end = separator.validate_range(args.start, args.end)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if len(urls) > 1 or args.playlist:
+        return cli_batch(urls, args, stems)
+
     try:
-        audio_file = downloader.download_audio(args.youtube_url)
+        span = separator.decode_span(start, end, args.model) if start is not None or end is not None else (None, None)
+        audio_file = (downloader.download_decoded(urls[0], start=span[0], end=span[1])
+                      or downloader.download_audio(urls[0]))
         if not audio_file:
             logger.error("Falha no download do áudio")
             return
 
-        separated_files = separator.separate(audio_file)
-
-        if args.refine:
-            logger.info("Refinando vocais…")
-            vocals_path = Path(separated_files['other'])
-            refined_vocals = vocal_refiner.full_refinement_pipeline(vocals_path)
-            separated_files['vocals_refined'] = refined_vocals
+        separated_files = separator.separate(
+            audio_file,
+            stems=stems,
+            two_stems=args.two_stems,
+            refine_stem=args.two_stems or 'other',
+            refiner=vocal_refiner.refine_to_file if args.refine else None,
+            output_format=args.format,
+            bitrate=args.bitrate,
+            model_name=args.model,
+            start=start,
+            end=end,
+        )
 
         print("Processamento concluído com sucesso!")
         print(f"Arquivo original: {audio_file}")
@@ -287,9 +729,47 @@ def cli_handler():
     except Exception as e:
         logger.error(f"Erro: {e}")
 
+def cli_batch(urls, args, stems):
+    """Processa várias URLs/uma playlist, baixando a próxima enquanto separa a atual"""
+    params = {
+        'urls': urls,
+        'playlist_url': args.playlist,
+        'refine_vocals': args.refine,
+        'stems': stems,
+        'two_stems': args.two_stems,
+        'format': args.format,
+        'bitrate': args.bitrate,
+        'model': args.model,
+        'start': args.start,
+        'end': args.end,
+    }
+    try:
+        result = pipeline.run_batch(Job('cli-batch', params))
+    except Exception as e:
+        logger.error(f"Erro: {e}")
+        return
+
+    print(f"Lote concluído: {result['completed']}/{result['total']} item(ns)")
+    for index, item in enumerate(result['items'], 1):
+        print(f"[{index}] {item['url']}: {item['status']}")
+        if item['error']:
+            print(f"  erro: {item['error']}")
+        for stem, path in (item['result'] or {}).get('separated', {}).items():
+            print(f"  {stem}: {path}")
+
 if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
         cli_handler()
     else:
-        app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+        # Com o reloader do modo debug, só o processo filho (que serve) aquece
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            create_runtime()
+            start_warm_up()
+        app.run(host='0.0.0.0', port=5000, debug=True)
+elif __name__ != '__mp_main__':
+    # Importado por um servidor WSGI: responde /api/health de imediato e
+    # fica pronto (/api/ready) quando o aquecimento terminar.
+    # (__mp_main__ é a reimportação feita pelos processos do pool de inferência)
+    create_runtime()
+    start_warm_up()
\ No newline at end of file
@@ -1,7 +1,22 @@
 # Package initialization
-from .downloader import YouTubeDownloader
-from .separator import AudioSeparator
-from .vocal_refiner import VocalRefiner
-from .models.model_manager import ModelManager
+# Os módulos pesados (torch, demucs, yt_dlp, noisereduce) só são importados
+# quando a classe correspondente é usada pela primeira vez
+import importlib
 
-__version__ = "1.0.0"
\ No newline at end of file
+_LAZY_EXPORTS = {
+    'YouTubeDownloader': '.downloader',
+    'AudioSeparator': '.separator',
+    'VocalRefiner': '.vocal_refiner',
+    'ModelManager': '.models.model_manager',
+}
+
+__version__ = "1.0.0"
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
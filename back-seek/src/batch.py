@@ -0,0 +1,85 @@
+import queue
+import threading
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_DONE = object()
+
+
+class AudioPrefetcher:
+    """Busca os próximos itens de um lote em segundo plano.
+
+    Uma thread percorre `items` chamando `fetch(índice, item)` (download e
+    decodificação) enquanto o consumidor separa o item atual; os resultados
+    chegam em ordem por uma fila limitada a `depth` itens. Com a fila cheia a
+    thread espera, então ficam em memória no máximo `depth` itens prontos mais
+    o que está sendo baixado.
+
+    A iteração gera (índice, item, valor, erro); uma falha em um item não
+    interrompe os demais.
+    """
+
+    def __init__(self, fetch: Callable[[int, Any], Any], items: List[Any], depth: int = 2):
+        self.fetch = fetch
+        self.items = list(items)
+        self.depth = max(1, depth)
+        self._queue = queue.Queue(maxsize=self.depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="batch-prefetch", daemon=True)
+
+    def _put(self, entry) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        for index, item in enumerate(self.items):
+            if self._stop.is_set():
+                return
+            try:
+                value, error = self.fetch(index, item), None
+            except Exception as e:
+                logger.warning(f"Falha ao pré-carregar item {index + 1}/{len(self.items)}: {e}")
+                value, error = None, e
+            if not self._put((index, item, value, error)):
+                return
+        self._put(_DONE)
+
+    def start(self) -> 'AudioPrefetcher':
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Interrompe a busca, espera a thread terminar e descarta os itens não consumidos.
+
+        Depois de close() nada mais é gravado pela thread (ex.: no workspace que
+        será descartado); um download em andamento para no próximo ponto de
+        cancelamento do trabalho ou ao terminar.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+    def __iter__(self) -> Iterator[Tuple[int, Any, Optional[Any], Optional[Exception]]]:
+        while True:
+            entry = self._queue.get()
+            if entry is _DONE:
+                return
+            yield entry
+
+    def __enter__(self) -> 'AudioPrefetcher':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
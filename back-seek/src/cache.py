@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ResultCache:
+    """Cache persistente de resultados de separação, endereçado por conteúdo.
+
+    A chave combina o id canônico do vídeo, o modelo e as opções de
+    processamento. Os stems são movidos para dentro do diretório do cache,
+    de forma que outros trabalhos não possam sobrescrevê-los.
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, cache_dir: Path = Path("cache"), max_bytes: int = 10 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index_path = self.cache_dir / self.INDEX_NAME
+        self._entries: Dict[str, Dict[str, Any]] = self._load_index()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(video_id: str, model_name: str, **options) -> str:
+        """Gera a chave do cache a partir do vídeo, modelo e opções"""
+        payload = json.dumps({'video': video_id, 'model': model_name, 'options': options}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if not self._index_path.exists():
+            return {}
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Índice do cache corrompido, recriando: {e}")
+            return {}
+
+    def _save_index(self):
+        # Escrita atômica para não deixar o índice pela metade
+        tmp_path = self._index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _is_valid(self, entry: Dict[str, Any]) -> bool:
+        """Confere se todos os arquivos da entrada existem com o tamanho esperado"""
+        for file_info in entry['files'].values():
+            path = Path(file_info['path'])
+            try:
+                if path.stat().st_size != file_info['size']:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _remove_entry(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for file_info in entry['files'].values():
+            try:
+                Path(file_info['path']).unlink()
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna o resultado em cache, validando os arquivos, ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if not self._is_valid(entry):
+                logger.warning(f"Entrada de cache inválida, descartando: {key[:12]}")
+                self._remove_entry(key)
+                self._save_index()
+                self.misses += 1
+                return None
+
+            entry['last_access'] = time.time()
+            self._save_index()
+            self.hits += 1
+            return dict(entry['result'])
+
+    def put(self, key: str, result: Dict[str, Any], files: Dict[str, Path]) -> Dict[str, Any]:
+        """Armazena os arquivos do resultado no cache.
+
+        Retorna o resultado com os caminhos reescritos para os arquivos do cache.
+        Se a chave já tem uma entrada válida (ex.: dois trabalhos com a mesma
+        chave terminando juntos), ela é mantida: os arquivos novos são apagados e
+        o resultado existente é retornado, pois seus arquivos podem estar em uso
+        por trabalhos já concluídos.
+        """
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and self._is_valid(existing):
+                for src in {str(src) for src in files.values()}:
+                    Path(src).unlink(missing_ok=True)
+                existing['last_access'] = time.time()
+                self._save_index()
+                logger.info(f"Resultado já estava no cache, mantendo a entrada existente: {key[:12]}")
+                return dict(existing['result'])
+            if existing is not None:
+                logger.warning(f"Entrada de cache inválida, substituindo: {key[:12]}")
+                self._remove_entry(key)
+
+            stored: Dict[str, Dict[str, Any]] = {}
+            moved: Dict[str, str] = {}
+            for name, src in files.items():
+                src = Path(src)
+                # O mesmo arquivo pode aparecer sob mais de um nome
+                if str(src) not in moved:
+                    dest = self._unique_dest(self.cache_dir / f"{key[:16]}_{src.name}", src)
+                    if src.resolve() != dest.resolve():
+                        shutil.move(str(src), str(dest))
+                    moved[str(src)] = str(dest)
+                dest = Path(moved[str(src)])
+                stored[name] = {'path': str(dest), 'size': dest.stat().st_size}
+
+            cached_result = _rewrite_paths(result, moved)
+            now = time.time()
+            self._entries[key] = {
+                'files': stored,
+                'result': cached_result,
+                'size': sum(f['size'] for f in stored.values()),
+                'created': now,
+                'last_access': now,
+            }
+            self._evict(keep=key)
+            self._save_index()
+
+        logger.info(f"Resultado armazenado no cache: {key[:12]}")
+        return cached_result
+
+    @staticmethod
+    def _unique_dest(dest: Path, src: Path) -> Path:
+        # Nunca sobrescreve um arquivo existente (pode ser o resultado de outro trabalho)
+        candidate, index = dest, 1
+        while candidate.exists() and candidate.resolve() != src.resolve():
+            candidate = dest.with_name(f"{dest.stem}_{index}{dest.suffix}")
+            index += 1
+        return candidate
+
+    def total_bytes(self) -> int:
+        return sum(entry['size'] for entry in self._entries.values())
+
+    def _evict(self, keep: Optional[str] = None):
+        """Remove as entradas menos usadas recentemente até caber no orçamento de disco"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        for key in sorted(self._entries, key=lambda k: self._entries[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries[key]['size']
+            logger.info(f"Evictando entrada do cache (LRU): {key[:12]}")
+            self._remove_entry(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def _rewrite_paths(value: Any, moved: Dict[str, str]) -> Any:
+    """Substitui caminhos movidos dentro de um resultado (dicts, listas e strings)"""
+    if isinstance(value, dict):
+        return {k: _rewrite_paths(v, moved) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rewrite_paths(v, moved) for v in value]
+    if isinstance(value, str):
+        return moved.get(value, value)
+    return value
@@ -0,0 +1,155 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Lê um inteiro de variável de ambiente, com valor padrão"""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_list(name: str, default: str) -> list:
+    """Lê uma lista separada por vírgulas de variável de ambiente"""
+    return [item.strip() for item in os.environ.get(name, default).split(',') if item.strip()]
+
+
+# ------------------------------------------------------------
+# Modelos
+# ------------------------------------------------------------
+# Modelo usado quando o pedido não escolhe um
+DEFAULT_MODEL = os.environ.get('DEFAULT_MODEL', 'htdemucs')
+# Modelos que os pedidos podem escolher
+AVAILABLE_MODELS = _env_list('AVAILABLE_MODELS', 'htdemucs,htdemucs_ft,htdemucs_6s,mdx_extra')
+# Modelos carregados na inicialização (os demais carregam no primeiro uso)
+PREWARM_MODELS = _env_list('PREWARM_MODELS', DEFAULT_MODEL)
+# Memória (MB) para modelos residentes; acima disso os menos usados são descarregados
+MODEL_MEMORY_BUDGET_MB = _env_int('MODEL_MEMORY_BUDGET_MB', 2048)
+# Precisão da inferência: fp32, bf16 (autocast) ou int8 (quantização dinâmica, CPU)
+INFERENCE_PRECISION = os.environ.get('INFERENCE_PRECISION', 'fp32')
+# 1 faz um forward de aquecimento com silêncio em cada modelo pré-carregado
+WARMUP_FORWARD = _env_int('WARMUP_FORWARD', 1)
+
+# ------------------------------------------------------------
+# Fila de trabalhos
+# ------------------------------------------------------------
+# Número de workers que executam o pipeline; com 2, a codificação de um
+# trabalho se sobrepõe à inferência do próximo
+SEPARATION_WORKERS = _env_int('SEPARATION_WORKERS', 2)
+# Máximo de trabalhos aguardando na fila antes de recusar novos pedidos
+JOB_QUEUE_SIZE = _env_int('JOB_QUEUE_SIZE', 32)
+# Tempo (s) que um trabalho finalizado continua consultável
+JOB_TTL = _env_int('JOB_TTL', 3600)
+
+# ------------------------------------------------------------
+# Progresso (SSE)
+# ------------------------------------------------------------
+# Tempo (s) que o progresso de um trabalho sem assinantes continua disponível
+PROGRESS_TTL = _env_int('PROGRESS_TTL', 600)
+# Intervalo (s) dos comentários de keepalive enviados nos streams ociosos
+SSE_KEEPALIVE = _env_int('SSE_KEEPALIVE', 15)
+# 1 cancela o trabalho quando todos os assinantes do progresso se desconectam
+CANCEL_ON_DISCONNECT = _env_int('CANCEL_ON_DISCONNECT', 1)
+# Tempo (s) para um assinante reconectar antes do cancelamento automático
+CANCEL_GRACE_SECONDS = _env_int('CANCEL_GRACE_SECONDS', 30)
+
+# ------------------------------------------------------------
+# Download / decodificação
+# ------------------------------------------------------------
+# 1 grava também o WAV decodificado em disco (por padrão o áudio fica só em memória)
+KEEP_DECODED_WAV = _env_int('KEEP_DECODED_WAV', 0)
+
+# ------------------------------------------------------------
+# Lotes / playlists (/api/batch)
+# ------------------------------------------------------------
+# Itens baixados e decodificados à frente do que está sendo separado
+PREFETCH_DEPTH = _env_int('PREFETCH_DEPTH', 2)
+# Máximo de URLs por lote (playlists maiores são truncadas)
+MAX_BATCH_URLS = _env_int('MAX_BATCH_URLS', 100)
+
+# ------------------------------------------------------------
+# Codificação dos stems
+# ------------------------------------------------------------
+# Threads que codificam stems em paralelo
+ENCODER_WORKERS = _env_int('ENCODER_WORKERS', 4)
+# Formato padrão dos stems (mp3, flac, opus ou npy)
+OUTPUT_FORMAT = os.environ.get('OUTPUT_FORMAT', 'mp3')
+# Trabalhos rodando o modelo ao mesmo tempo (sem o motor em lote)
+INFERENCE_SLOTS = _env_int('INFERENCE_SLOTS', 1)
+
+# ------------------------------------------------------------
+# Armazenamento (workspaces por trabalho)
+# ------------------------------------------------------------
+# Cada trabalho grava download e stems em WORKSPACE_DIR/<job_id>/
+WORKSPACE_DIR = os.environ.get('WORKSPACE_DIR', 'workspaces')
+# Cota de disco (MB) dos workspaces; acima disso os arquivos menos acessados são removidos
+STORAGE_MAX_MB = _env_int('STORAGE_MAX_MB', 20480)
+# Intervalo (s) da limpeza em segundo plano
+STORAGE_EVICT_INTERVAL = _env_int('STORAGE_EVICT_INTERVAL', 60)
+
+# ------------------------------------------------------------
+# Cache de resultados
+# ------------------------------------------------------------
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', 'cache')
+# Orçamento de disco do cache (MB); entradas menos usadas são removidas acima disso
+RESULT_CACHE_MAX_MB = _env_int('RESULT_CACHE_MAX_MB', 10240)
+
+# ------------------------------------------------------------
+# Trechos (start/end) e cache de janelas
+# ------------------------------------------------------------
+# Áudio extra (s) separado em cada borda de um trecho e descartado depois
+RANGE_CONTEXT_SECONDS = _env_int('RANGE_CONTEXT_SECONDS', 8)
+# Tamanho (s) das janelas separadas guardadas em cache
+WINDOW_SECONDS = _env_int('WINDOW_SECONDS', 30)
+WINDOW_CACHE_DIR = os.environ.get('WINDOW_CACHE_DIR', 'window_cache')
+# Orçamento de disco do cache de janelas (MB); 0 (padrão) desativa o cache.
+# Cada janela guarda todas as fontes em float32 (~42 MB por 30 s), então só
+# vale a pena ativar quando trechos da mesma faixa são pedidos com frequência
+WINDOW_CACHE_MAX_MB = _env_int('WINDOW_CACHE_MAX_MB', 0)
+
+# ------------------------------------------------------------
+# Prévia rápida (preview)
+# ------------------------------------------------------------
+# Duração (s) do trecho separado na prévia, a partir do início do pedido
+PREVIEW_SECONDS = _env_int('PREVIEW_SECONDS', 30)
+# Sobreposição entre segmentos na prévia (%); a separação completa usa 25%
+PREVIEW_OVERLAP_PERCENT = _env_int('PREVIEW_OVERLAP_PERCENT', 10)
+# Modelo da prévia (vazio = o mesmo do trabalho, em uma única passada)
+PREVIEW_MODEL = os.environ.get('PREVIEW_MODEL', '')
+
+# ------------------------------------------------------------
+# Downloads (/api/download)
+# ------------------------------------------------------------
+# Validade (s) no Cache-Control dos arquivos servidos (revalidados por ETag)
+DOWNLOAD_MAX_AGE = _env_int('DOWNLOAD_MAX_AGE', 3600)
+# Prefixo interno do nginx para X-Accel-Redirect (vazio = Flask envia o arquivo)
+DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '')
+
+# ------------------------------------------------------------
+# Streaming de stems
+# ------------------------------------------------------------
+# Blocos prontos aguardando envio antes de o worker esperar pelo cliente
+STREAM_MAX_PENDING = _env_int('STREAM_MAX_PENDING', 8)
+# Tempo (s) sem consumo do cliente antes de abortar a separação
+STREAM_CLIENT_TIMEOUT = _env_int('STREAM_CLIENT_TIMEOUT', 60)
+
+# ------------------------------------------------------------
+# Inferência em lote (micro-batching entre trabalhos)
+# ------------------------------------------------------------
+# 0 desativa o motor em lote: o separador mantém o mesmo laço de segmentos,
+# mas cada segmento passa sozinho pelo modelo (sem juntar trabalhos), com
+# INFERENCE_SLOTS limitando as separações simultâneas
+BATCH_INFERENCE = _env_int('BATCH_INFERENCE', 1)
+# Máximo de segmentos por forward
+BATCH_MAX_SIZE = _env_int('BATCH_MAX_SIZE', 4)
+# Janela (ms) para juntar segmentos de trabalhos diferentes
+BATCH_WINDOW_MS = _env_int('BATCH_WINDOW_MS', 20)
+
+# ------------------------------------------------------------
+# Pool de processos de inferência (apenas CPU)
+# ------------------------------------------------------------
+# >0 roda os segmentos nesse número de processos, com uma cópia dos pesos
+# em memória compartilhada (substitui o motor em lote)
+PROCESS_WORKERS = _env_int('PROCESS_WORKERS', 0)
+# Threads do torch por processo (0 = núcleos disponíveis / processos)
+THREADS_PER_WORKER = _env_int('THREADS_PER_WORKER', 0)
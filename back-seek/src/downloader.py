@@ -1,14 +1,32 @@
 import yt_dlp
 from pathlib import Path
-from typing import Optional, Callable
+from typing import Callable, List, Optional
 from .utils.logger import setup_logger
+from urllib.parse import urlparse, parse_qs
+from .utils.audio_io import DecodedAudio
+from .metrics import FALLBACKS, track_stage
+from .jobs import JobCancelled
+from .utils.file_utils import atomic_output
+import numpy as np
+import soundfile as sf
 import subprocess
+import shutil
+import uuid
+import re
 import os
 
 logger = setup_logger(__name__)
 
-FFMPEG_PATH = r"C:\Users\Rennan\tools\ffmpeg-master-latest-win64-gpl\ffmpeg-master-latest-win64-gpl\bin"
-os.environ['PATH'] = FFMPEG_PATH + ';' + os.environ['PATH']
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', r"C:\Users\Rennan\tools\ffmpeg-master-latest-win64-gpl\ffmpeg-master-latest-win64-gpl\bin")
+os.environ['PATH'] = FFMPEG_PATH + os.pathsep + os.environ['PATH']
+
+def get_ffmpeg_exe() -> str:
+    """Executável do FFmpeg: o de FFMPEG_PATH se existir, senão o do PATH"""
+    for name in ("ffmpeg.exe", "ffmpeg"):
+        candidate = os.path.join(FFMPEG_PATH, name)
+        if os.path.exists(candidate):
+            return candidate
+    return shutil.which("ffmpeg") or "ffmpeg"
 
 class YouTubeDownloader:
     
@@ -16,26 +34,212 @@ class YouTubeDownloader:
         self.output_dir = output_dir
         self.output_dir.mkdir(exist_ok=True)
     
-    def download_audio(self, youtube_url: str, progress_callback: Callable = None) -> Optional[Path]:
+    def get_video_info(self, youtube_url: str) -> dict:
+        """Extrai os metadados do vídeo sem baixar o áudio"""
+        ydl_opts = {
+            'quiet': True,
+            'skip_download': True,
+            'noplaylist': True,
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(youtube_url, download=False)
+
+    def expand_playlist(self, playlist_url: str) -> List[str]:
+        """URLs dos vídeos de uma playlist (ou a própria URL, se for um vídeo)"""
+        ydl_opts = {
+            'quiet': True,
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(playlist_url, download=False)
+
+        entries = info.get('entries')
+        if entries is None:
+            return [playlist_url]
+
+        urls = []
+        for entry in entries:
+            if not entry:
+                continue
+            url = entry.get('url') or entry.get('webpage_url')
+            if not url or not url.startswith('http'):
+                url = f"https://www.youtube.com/watch?v={entry['id']}"
+            urls.append(url)
+        logger.info(f"Playlist com {len(urls)} vídeo(s): {playlist_url}")
+        return urls
+
+    @staticmethod
+    def quick_video_id(youtube_url: str) -> str:
+        """Extrai o id do vídeo da URL sem acessar a rede.
+
+        Usado para deduplicar pedidos simultâneos; se a URL não for reconhecida,
+        retorna a própria URL normalizada.
+        """
+        url = youtube_url.strip()
+        parsed = urlparse(url)
+        host = parsed.netloc.lower().split(':')[0]
+        if host.startswith('www.') or host.startswith('m.'):
+            host = host.split('.', 1)[1]
+
+        video_id = None
+        if host == 'youtu.be':
+            video_id = parsed.path.lstrip('/').split('/')[0]
+        elif host.endswith('youtube.com'):
+            if parsed.path == '/watch':
+                video_id = parse_qs(parsed.query).get('v', [None])[0]
+            else:
+                match = re.match(r'^/(?:shorts|embed|live|v)/([^/?#]+)', parsed.path)
+                if match:
+                    video_id = match.group(1)
+
+        if video_id and re.fullmatch(r'[A-Za-z0-9_-]{11}', video_id):
+            return f"Youtube:{video_id}"
+        return url
+
+    @staticmethod
+    def canonical_video_id(info: dict) -> str:
+        """Identificador canônico do vídeo (extractor + id), independente da forma da URL"""
+        extractor = info.get('extractor_key') or info.get('extractor') or 'generic'
+        return f"{extractor}:{info['id']}"
+
+    def download_audio(self, youtube_url: str, progress_callback: Callable = None,
+                       output_name: str = None, output_dir: Optional[Path] = None) -> Optional[Path]:
+        # Nome único por download para que trabalhos simultâneos não se sobrescrevam
+        output_name = output_name or f"audio_{uuid.uuid4().hex[:12]}"
         try:
-            try:
-                return self._download_and_convert(youtube_url, progress_callback)
-            except Exception as e:
-                logger.warning(f"Tentativa 1 falhou: {e}")
-            
-            try:
-                return self._download_direct(youtube_url, progress_callback)
-            except Exception as e:
-                logger.warning(f"Tentativa 2 falhou: {e}")
-                raise Exception("Todas as tentativas de download falharam")
+            with track_stage('download'):
+                try:
+                    return self._download_and_convert(youtube_url, progress_callback, output_name, output_dir)
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Tentativa 1 falhou: {e}")
+                    FALLBACKS.inc(kind='download_direct')
+
+                try:
+                    return self._download_direct(youtube_url, progress_callback, output_name, output_dir)
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Tentativa 2 falhou: {e}")
+                    raise Exception("Todas as tentativas de download falharam")
                 
+        except JobCancelled:
+            # O progress_callback levantou o cancelamento entre fragmentos
+            logger.info("Download interrompido: trabalho cancelado")
+            self.cleanup_temp_files(output_name, output_dir)
+            raise
         except Exception as e:
             logger.error(f"Erro no download: {e}")
             return None
     
-    def _download_and_convert(self, youtube_url: str, progress_callback: Callable = None) -> Path:
+    def download_decoded(self, youtube_url: str, progress_callback: Callable = None,
+                         output_name: str = None, keep_wav: bool = False,
+                         output_dir: Optional[Path] = None, start: Optional[float] = None,
+                         end: Optional[float] = None) -> Optional[DecodedAudio]:
+        """Baixa o áudio e decodifica direto para memória, sem WAV intermediário.
+
+        O FFmpeg envia PCM float32 pelo stdout para um buffer numpy entregue ao
+        separador. O arquivo baixado é apagado depois de decodificado; o WAV só
+        é gravado em disco se `keep_wav` for True.
+        JobCancelled levantada pelo `progress_callback` (a cada fragmento)
+        interrompe o download, remove os arquivos parciais e é propagada.
+        `output_dir` (ex.: o workspace do trabalho) substitui o diretório padrão.
+        Com `start`/`end` (segundos), só esse trecho é decodificado.
+        """
+        output_dir = output_dir or self.output_dir
+        output_name = output_name or f"audio_{uuid.uuid4().hex[:12]}"
         try:
-            output_base = self.output_dir / "audio_temp"
+            # Callback de progresso para yt-dlp (download = 0-80%)
+            def yt_dlp_progress_hook(d):
+                if progress_callback and d['status'] == 'downloading':
+                    total = d.get('total_bytes') or d.get('total_bytes_estimate') or 1
+                    progress = d.get('downloaded_bytes', 0) / total * 80
+                    progress_callback(min(progress, 80))
+
+            ydl_opts = {
+                'format': 'bestaudio[ext=m4a]/bestaudio',
+                'outtmpl': str(output_dir / output_name) + '.%(ext)s',
+                'restrictfilenames': True,
+                'quiet': False,
+                'progress_hooks': [yt_dlp_progress_hook],
+            }
+
+            logger.info(f"Baixando áudio: {youtube_url}")
+            with track_stage('download'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(youtube_url, download=True)
+                source_path = Path(ydl.prepare_filename(info))
+
+            if progress_callback:
+                progress_callback(80)
+
+            with track_stage('decode'):
+                try:
+                    audio = self.decode_audio(source_path, name=output_name, start=start, end=end)
+                finally:
+                    # O download comprimido só serve para a decodificação
+                    source_path.unlink(missing_ok=True)
+
+            if keep_wav:
+                wav_path = source_path.with_suffix('.wav')
+                with atomic_output(wav_path) as tmp_path:
+                    sf.write(str(tmp_path), audio.samples, audio.samplerate, subtype='PCM_16')
+                audio.wav_path = wav_path
+                logger.info(f"WAV gravado: {wav_path}")
+
+            if progress_callback:
+                progress_callback(100)
+            return audio
+
+        except JobCancelled:
+            # O progress_callback levantou o cancelamento entre fragmentos
+            logger.info("Download interrompido: trabalho cancelado")
+            self.cleanup_temp_files(output_name, output_dir)
+            raise
+        except Exception as e:
+            logger.error(f"Erro no download/decodificação: {e}")
+            self.cleanup_temp_files(output_name, output_dir)
+            return None
+
+    def decode_audio(self, source_path: Path, samplerate: int = 44100, channels: int = 2,
+                     name: str = None, start: Optional[float] = None,
+                     end: Optional[float] = None) -> DecodedAudio:
+        """Decodifica qualquer formato suportado pelo FFmpeg para float32 em memória.
+
+        Com `start`/`end` (segundos), decodifica só o trecho (busca na entrada,
+        sem decodificar o que vem antes); o DecodedAudio guarda onde ele começa.
+        """
+        start = start or 0.0
+        cmd = [get_ffmpeg_exe(), '-v', 'error']
+        if start:
+            cmd += ['-ss', f"{start:.6f}"]
+        cmd += ['-i', str(source_path)]
+        if end is not None:
+            cmd += ['-t', f"{end - start:.6f}"]
+        cmd += [
+            '-f', 'f32le',
+            '-acodec', 'pcm_f32le',
+            '-ac', str(channels),
+            '-ar', str(samplerate),
+            'pipe:1'
+        ]
+
+        logger.info(f"Decodificando {source_path} em memória...")
+        process = subprocess.run(cmd, capture_output=True, timeout=300)
+        if process.returncode != 0:
+            raise Exception(f"FFmpeg falhou: {process.stderr.decode(errors='replace')}")
+
+        # Visão direta sobre o buffer do stdout: [samples, canais], sem cópia
+        samples = np.frombuffer(process.stdout, dtype='<f4').reshape(-1, channels)
+        logger.info(f"Decodificação concluída: {samples.shape}, SR: {samplerate}")
+        return DecodedAudio(samples, samplerate, name=name or source_path.stem, source_path=source_path,
+                            start=start, end=end)
+
+    def _download_and_convert(self, youtube_url: str, progress_callback: Callable = None,
+                              output_name: str = "audio_temp", output_dir: Optional[Path] = None) -> Path:
+        try:
+            output_base = (output_dir or self.output_dir) / output_name
             
             # Callback de progresso para yt-dlp
             def yt_dlp_progress_hook(d):
@@ -63,7 +267,7 @@ class YouTubeDownloader:
             wav_path = m4a_path.with_suffix('.wav')
             logger.info(f"Convertendo {m4a_path} para WAV...")
             
-            ffmpeg_exe = os.path.join(FFMPEG_PATH, "ffmpeg.exe")
+            ffmpeg_exe = get_ffmpeg_exe()
             
             cmd = [
                 ffmpeg_exe,
@@ -71,13 +275,13 @@ class YouTubeDownloader:
                 '-ac', '2',
                 '-ar', '44100',
                 '-y',
-                str(wav_path)
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-            
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg falhou: {result.stderr}")
+            # O WAV só aparece com o nome final depois da conversão completa
+            with atomic_output(wav_path) as tmp_path:
+                result = subprocess.run(cmd + [str(tmp_path)], capture_output=True, text=True, timeout=120)
+                if result.returncode != 0:
+                    raise Exception(f"FFmpeg falhou: {result.stderr}")
             
             if m4a_path.exists():
                 m4a_path.unlink()
@@ -89,12 +293,13 @@ class YouTubeDownloader:
             return wav_path
             
         except Exception as e:
-            self.cleanup_temp_files()
+            self.cleanup_temp_files(output_name, output_dir)
             raise e
     
-    def _download_direct(self, youtube_url: str, progress_callback: Callable = None) -> Path:
+    def _download_direct(self, youtube_url: str, progress_callback: Callable = None,
+                         output_name: str = "audio_temp", output_dir: Optional[Path] = None) -> Path:
         try:
-            output_path = self.output_dir / "audio_direct.%(ext)s"
+            output_path = (output_dir or self.output_dir) / f"{output_name}_direct.%(ext)s"
             
             # Callback de progresso para yt-dlp
             def yt_dlp_progress_hook(d):
@@ -125,11 +330,15 @@ class YouTubeDownloader:
         except Exception as e:
             raise e
     
-    def cleanup_temp_files(self):
-        temp_patterns = ['audio_temp.*', 'audio_direct.*', '*.part', '*.ytdl']
+    def cleanup_temp_files(self, output_name: str = None, output_dir: Optional[Path] = None):
+        if output_name:
+            # Limpa apenas os arquivos deste download
+            temp_patterns = [f'{output_name}.*', f'{output_name}_direct.*']
+        else:
+            temp_patterns = ['audio_temp.*', 'audio_direct.*', '*.part', '*.ytdl']
         
         for pattern in temp_patterns:
-            for temp_file in self.output_dir.glob(pattern):
+            for temp_file in (output_dir or self.output_dir).glob(pattern):
                 try:
                     temp_file.unlink()
                     logger.info(f"Arquivo temporário removido: {temp_file}")
@@ -137,7 +346,7 @@ class YouTubeDownloader:
                     pass
 
 try:
-    ffmpeg_test = os.path.join(FFMPEG_PATH, "ffmpeg.exe")
+    ffmpeg_test = get_ffmpeg_exe()
     if os.path.exists(ffmpeg_test):
         logger.info("FFmpeg encontrado com sucesso!")
     else:
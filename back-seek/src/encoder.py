@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+from .metrics import track_stage
+from .utils.file_utils import atomic_output
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Formatos de saída: extensão, formato/subtipo do libsndfile e faixa de bitrate (kbps)
+FORMATS = {
+    'mp3': {'ext': 'mp3', 'format': 'MP3', 'subtype': 'MPEG_LAYER_III', 'bitrate': (32, 320)},
+    'flac': {'ext': 'flac', 'format': 'FLAC', 'subtype': 'PCM_16', 'bitrate': None},
+    'opus': {'ext': 'opus', 'format': 'OGG', 'subtype': 'OPUS', 'bitrate': (6, 256)},
+    # float32 cru [samples, canais], para reaproveitamento interno sem decodificação
+    'npy': {'ext': 'npy', 'format': None, 'subtype': None, 'bitrate': None},
+}
+
+# O Opus só aceita 8/12/16/24/48 kHz
+_OPUS_SAMPLERATE = 48000
+
+
+class StemEncoder:
+    """Codifica os stems separados em paralelo, no formato pedido.
+
+    A codificação (libsndfile) libera o GIL, então um pool de threads basta para
+    usar vários núcleos; o worker que pediu a codificação só espera o resultado,
+    e o modelo fica livre para o próximo trabalho.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stem-encoder")
+        self._lock = threading.Lock()
+        self._encoded = 0
+        self._encode_seconds = 0.0
+
+    @staticmethod
+    def validate_format(output_format: str, bitrate: Optional[int] = None):
+        """Valida formato e bitrate (kbps), levantando ValueError se inválidos"""
+        spec = FORMATS.get(output_format)
+        if spec is None:
+            raise ValueError(f"Formato desconhecido: {output_format}. Opções: {', '.join(FORMATS)}")
+        if bitrate is None:
+            return
+        if spec['bitrate'] is None:
+            raise ValueError(f"O formato {output_format} não aceita bitrate")
+        low, high = spec['bitrate']
+        if not isinstance(bitrate, int) or not low <= bitrate <= high:
+            raise ValueError(f"Bitrate inválido para {output_format}: {bitrate} (de {low} a {high} kbps)")
+
+    @staticmethod
+    def _compression_level(output_format: str, bitrate: int, channels: int) -> float:
+        """Converte o bitrate (kbps) no compression_level (0-1) do libsndfile"""
+        if output_format == 'mp3':
+            # Taxa constante de 320 kbps (0.0) a 32 kbps (1.0)
+            return min(0.99, (320 - bitrate) / (320 - 32))
+        # Opus: de 256 a 6 kbps por canal; o pedido é o bitrate total
+        per_channel = min(256.0, max(6.0, bitrate / channels))
+        return min(0.99, max(0.0, (256 - per_channel) / (256 - 6)))
+
+    def encode(self, audio: np.ndarray, samplerate: int, output_base: Path,
+               output_format: str = 'mp3', bitrate: Optional[int] = None) -> Path:
+        """Grava `audio` [samples, canais] em `output_base` + extensão do formato"""
+        spec = FORMATS[output_format]
+        output_file = output_base.with_name(f"{output_base.name}.{spec['ext']}")
+        start = time.time()
+
+        # Grava em um temporário e renomeia: o stem só aparece quando completo
+        with track_stage('encoding'), atomic_output(output_file) as tmp_file:
+            if output_format == 'npy':
+                np.save(str(tmp_file), np.ascontiguousarray(audio, dtype=np.float32))
+            else:
+                options = {}
+                if bitrate is not None:
+                    options['compression_level'] = self._compression_level(output_format, bitrate, audio.shape[1])
+                    if output_format == 'mp3':
+                        options['bitrate_mode'] = 'CONSTANT'
+                if output_format == 'opus' and samplerate != _OPUS_SAMPLERATE:
+                    audio = resample_poly(audio, _OPUS_SAMPLERATE, samplerate, axis=0).astype(np.float32)
+                    samplerate = _OPUS_SAMPLERATE
+                sf.write(str(tmp_file), audio, samplerate,
+                         format=spec['format'], subtype=spec['subtype'], **options)
+
+        with self._lock:
+            self._encoded += 1
+            self._encode_seconds += time.time() - start
+        return output_file
+
+    def submit(self, audio: np.ndarray, samplerate: int, output_base: Path,
+               output_format: str = 'mp3', bitrate: Optional[int] = None) -> Future:
+        """Enfileira a codificação no pool; o Future recebe o caminho gravado"""
+        return self._pool.submit(self.encode, audio, samplerate, output_base, output_format, bitrate)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'encoded': self._encoded,
+                'encode_seconds': self._encode_seconds,
+            }
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+from flask import Response, send_file
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Índices (index.json do cache/armazenamento) e temporários nunca são servidos
+_PRIVATE_SUFFIXES = ('.json', '.tmp')
+
+
+def _servable(name: str) -> bool:
+    """Se o arquivo pode ser servido: não é oculto/parcial, índice nem temporário"""
+    return not name.startswith('.') and not name.lower().endswith(_PRIVATE_SUFFIXES)
+
+
+class FileEntry:
+    """Arquivo servível com os metadados usados nos cabeçalhos HTTP"""
+
+    def __init__(self, path: Path, stat: os.stat_result):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+
+    @property
+    def etag(self) -> str:
+        # Os arquivos são gravados uma vez e não mudam depois; tamanho e mtime
+        # em nanossegundos identificam o conteúdo (ETag forte, sem aspas)
+        return f"{self.size:x}-{self.mtime_ns:x}"
+
+
+class FileIndex:
+    """Índice nome do arquivo -> caminho para /api/download.
+
+    Os resultados dos trabalhos são registrados ao terminar; nomes
+    desconhecidos disparam uma varredura dos diretórios e subdiretórios (no máximo uma a cada
+    `rescan_interval` segundos), em vez de testar cada diretório a cada pedido.
+    Em um nome conhecido, resolver custa um único stat.
+    """
+
+    def __init__(self, roots: Iterable[Path], rescan_interval: float = 2.0):
+        self.roots = [Path(root).absolute() for root in roots]
+        self.rescan_interval = rescan_interval
+        self._paths: Dict[str, Path] = {}
+        self._lock = threading.Lock()
+        self._last_scan = 0.0
+        self._scan()
+
+    def _scan(self):
+        found = {}
+        for root in self.roots:
+            # Inclui subdiretórios (workspaces por trabalho); ignora ocultos, parciais e índices
+            for directory, subdirs, files in os.walk(root):
+                subdirs[:] = [name for name in subdirs if not name.startswith('.')]
+                for name in files:
+                    if _servable(name):
+                        found.setdefault(name, Path(directory) / name)
+        with self._lock:
+            # Registros explícitos têm prioridade sobre a varredura
+            found.update({name: path for name, path in self._paths.items() if path.exists()})
+            self._paths = found
+            self._last_scan = time.monotonic()
+        logger.info(f"Índice de arquivos: {len(found)} arquivo(s) em {len(self.roots)} diretório(s)")
+
+    def register(self, path) -> None:
+        path = Path(path).absolute()
+        if not _servable(path.name):
+            return
+        with self._lock:
+            self._paths[path.name] = path
+
+    def register_result(self, value: Any) -> None:
+        """Registra todos os caminhos de arquivos existentes em um resultado (dict/lista)"""
+        if isinstance(value, dict):
+            for item in value.values():
+                self.register_result(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                self.register_result(item)
+        elif isinstance(value, (str, Path)) and value:
+            path = Path(value)
+            if path.suffix and path.is_file():
+                self.register(path)
+
+    def resolve(self, name: str) -> Optional[FileEntry]:
+        """Entrada do arquivo pelo nome, ou None se não existir (ou não puder ser servido)"""
+        if not _servable(name):
+            return None
+        for attempt in range(2):
+            with self._lock:
+                path = self._paths.get(name)
+            if path is not None:
+                try:
+                    return FileEntry(path, path.stat())
+                except FileNotFoundError:
+                    # Removido (ex.: despejo do cache)
+                    with self._lock:
+                        if self._paths.get(name) == path:
+                            del self._paths[name]
+            if attempt == 0 and time.monotonic() - self._last_scan >= self.rescan_interval:
+                self._scan()
+            else:
+                break
+        return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._paths)
+
+
+def download_response(entry: FileEntry, max_age: int = 3600, accel_prefix: str = '') -> Response:
+    """Resposta de /api/download para o arquivo (ETag, Last-Modified, Range e 304)"""
+    if accel_prefix:
+        # O nginx trata Range e pedidos condicionais e envia com sendfile
+        response = Response()
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + Path(os.path.relpath(entry.path)).as_posix()
+        response.headers['Content-Disposition'] = f'attachment; filename="{entry.path.name}"'
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        response.set_etag(entry.etag)
+        return response
+
+    # O corpo completo vai pelo wsgi.file_wrapper do servidor (sendfile, sem
+    # cópia em Python); com Range, só o trecho pedido é lido
+    return send_file(
+        entry.path,
+        as_attachment=True,
+        conditional=True,
+        etag=entry.etag,
+        last_modified=entry.mtime,
+        max_age=max_age,
+    )
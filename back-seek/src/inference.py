@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict
+import torch
+from demucs.apply import apply_model
+from .models.model_manager import inference_context
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _Request:
+    __slots__ = ('model', 'chunk', 'future', 'submitted_at')
+
+    def __init__(self, model, chunk: torch.Tensor):
+        self.model = model
+        self.chunk = chunk
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+
+
+class BatchInferenceEngine:
+    """Agrupa segmentos de vários trabalhos em um único forward do modelo.
+
+    Os segmentos (todos com o tamanho de treino do modelo) são coletados por até
+    `window_ms` ou até `max_batch` itens, empilhados em [B, canais, samples] e
+    processados de uma vez; cada resultado volta para o Future do seu trabalho.
+    """
+
+    def __init__(self, device: str, max_batch: int = 4, window_ms: float = 20):
+        self.device = device
+        self.max_batch = max(1, max_batch)
+        self.window_ms = window_ms
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._segments = 0
+        self._wait_total = 0.0
+        self._busy_total = 0.0
+
+        self._thread = threading.Thread(target=self._loop, name="batch-inference", daemon=True)
+        self._thread.start()
+        logger.info(f"Motor de inferência em lote iniciado (max_batch={self.max_batch}, janela={self.window_ms}ms)")
+
+    def submit(self, model, chunk: torch.Tensor) -> Future:
+        """Enfileira um segmento [canais, samples]; o Future recebe [fontes, canais, samples]"""
+        request = _Request(model, chunk)
+        self._pending.put(request)
+        return request.future
+
+    def _collect(self):
+        """Aguarda o primeiro pedido e junta outros até encher o lote ou fechar a janela"""
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.window_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+
+            # Pedidos de modelos diferentes não podem dividir o mesmo forward
+            groups: Dict[int, list] = {}
+            for request in batch:
+                groups.setdefault(id(request.model), []).append(request)
+
+            for requests in groups.values():
+                self._run(requests)
+
+    def _run(self, requests):
+        started = time.monotonic()
+        try:
+            mix = torch.stack([request.chunk for request in requests])
+            model = requests[0].model
+            with torch.no_grad(), inference_context(model, self.device):
+                out = apply_model(model, mix, device=self.device, shifts=0, split=False).float()
+            for request, result in zip(requests, out):
+                request.future.set_result(result)
+        except Exception as e:
+            logger.error(f"Erro na inferência em lote: {e}")
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._batches += 1
+                self._segments += len(requests)
+                self._wait_total += sum(started - request.submitted_at for request in requests)
+                self._busy_total += finished - started
+
+    def stats(self) -> Dict[str, Any]:
+        """Configuração e contadores do motor"""
+        with self._lock:
+            return {
+                'max_batch': self.max_batch,
+                'window_ms': self.window_ms,
+                'batches': self._batches,
+                'segments': self._segments,
+                'avg_batch_size': self._segments / self._batches if self._batches else 0.0,
+                'avg_wait_ms': 1000 * self._wait_total / self._segments if self._segments else 0.0,
+                'busy_seconds': self._busy_total,
+            }
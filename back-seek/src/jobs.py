@@ -0,0 +1,267 @@
+import re
+import threading
+import queue
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+from .metrics import JOB_SECONDS, JOBS_TOTAL, QUEUE_WAIT_SECONDS
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Ids de trabalho informados pelo cliente viram nomes de diretório (workspaces)
+_JOB_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def validate_job_id(job_id: Optional[str]) -> None:
+    """Levanta ValueError se o jobId informado pelo cliente não for seguro"""
+    if job_id is not None and (not isinstance(job_id, str) or not _JOB_ID_RE.match(job_id)):
+        raise ValueError('jobId inválido: use de 1 a 64 letras, números, "_" ou "-"')
+
+
+class QueueFullError(Exception):
+    """Fila de trabalhos cheia"""
+
+
+class JobCancelled(Exception):
+    """Levantada nos pontos de verificação de um trabalho cancelado"""
+
+    counts_as_failure = False
+
+
+class Job:
+    """Trabalho de separação enfileirado"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, job_id: str, params: Dict[str, Any], dedup_key: Optional[str] = None):
+        self.id = job_id
+        self.params = params
+        self.dedup_key = dedup_key
+        # Quantos pedidos idênticos foram anexados a este trabalho
+        self.attached = 0
+        # Detalhes da etapa em andamento (ex.: segmentos do Demucs e ETA)
+        self.stage = None
+        self.stage_details = None
+        # Resultado da prévia rápida, substituído pelo resultado completo ao terminar
+        self.preview = None
+        self.status = Job.QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (Job.COMPLETED, Job.FAILED, Job.CANCELLED)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Pede o cancelamento; o trabalho para no próximo ponto de verificação"""
+        self._cancel.set()
+
+    def check_cancelled(self):
+        """Ponto de verificação: levanta JobCancelled se o cancelamento foi pedido"""
+        if self._cancel.is_set():
+            raise JobCancelled(f"Trabalho {self.id} cancelado")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Resumo do trabalho para a API"""
+        return {
+            'jobId': self.id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'attached': self.attached,
+            'cancel_requested': self.cancel_requested,
+            'stage': self.stage,
+            'stage_details': self.stage_details,
+            'preview': self.preview,
+        }
+
+
+class JobQueue:
+    """Fila de trabalhos com pool limitado de workers"""
+
+    def __init__(self, handler: Callable[[Job], Any], num_workers: int = 1,
+                 max_queued: int = 32, job_ttl: float = 3600,
+                 on_finish: Optional[Callable[[Job], None]] = None):
+        self.handler = handler
+        self.on_finish = on_finish
+        self.job_ttl = job_ttl
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs: Dict[str, Job] = {}
+        # Ids de pedidos anexados a um trabalho em andamento -> id do trabalho
+        self._aliases: Dict[str, str] = {}
+        # Chave de deduplicação -> trabalho em andamento (single-flight)
+        self._inflight: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+        for i in range(max(1, num_workers)):
+            worker = threading.Thread(target=self._worker_loop, name=f"separation-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"Fila de trabalhos iniciada com {len(self._workers)} worker(s)")
+
+    def submit(self, params: Dict[str, Any], job_id: Optional[str] = None,
+               dedup_key: Optional[str] = None) -> Tuple[Job, bool]:
+        """Enfileira um trabalho e retorna imediatamente.
+
+        Se já existe um trabalho em andamento com a mesma dedup_key, o pedido é
+        anexado a ele em vez de criar outro. Retorna (trabalho, criado).
+        """
+        validate_job_id(job_id)
+        with self._lock:
+            self._purge_expired()
+
+            leader = self._inflight.get(dedup_key) if dedup_key else None
+            if leader is not None:
+                leader.attached += 1
+                if job_id and job_id != leader.id:
+                    self._aliases[job_id] = leader.id
+                logger.info(f"[{leader.id}] Pedido idêntico anexado ao trabalho em andamento ({job_id or 'sem id'})")
+                return leader, False
+
+            job_id = job_id or uuid.uuid4().hex
+            existing = self._jobs.get(job_id)
+            if existing is not None and not existing.finished:
+                raise ValueError(f"Trabalho {job_id} já está em andamento")
+
+            job = Job(job_id, params, dedup_key=dedup_key)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError("Fila de trabalhos cheia, tente novamente mais tarde")
+
+            self._aliases.pop(job_id, None)
+            self._jobs[job_id] = job
+            if dedup_key:
+                self._inflight[dedup_key] = job
+
+        logger.info(f"[{job_id}] Trabalho enfileirado ({self._queue.qsize()} na fila)")
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Busca um trabalho pelo id próprio ou pelo id de um pedido anexado"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None and job_id in self._aliases:
+                job = self._jobs.get(self._aliases[job_id])
+            return job
+
+    def cancel(self, job_id: str, detach: bool = True) -> Optional[Job]:
+        """Cancela um trabalho (pelo id próprio ou de um pedido anexado).
+
+        Com `detach`, se outros pedidos idênticos estão anexados ao trabalho,
+        apenas um deles é desanexado e o trabalho continua para os demais.
+        Trabalhos na fila são finalizados na hora; em execução, param no
+        próximo ponto de verificação. Retorna o trabalho, ou None se não existir.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None and job_id in self._aliases:
+                job = self._jobs.get(self._aliases[job_id])
+            if job is None or job.finished:
+                return job
+            if detach and job.attached > 0:
+                job.attached -= 1
+                self._aliases.pop(job_id, None)
+                logger.info(f"[{job.id}] Pedido desanexado ({job.attached} restante(s)); trabalho continua")
+                return job
+
+            job.cancel()
+            # Novos pedidos idênticos não devem se anexar a um trabalho sendo cancelado
+            if job.dedup_key and self._inflight.get(job.dedup_key) is job:
+                del self._inflight[job.dedup_key]
+            queued = job.status == Job.QUEUED
+            if queued:
+                job.status = Job.CANCELLED
+
+        if queued:
+            logger.info(f"[{job.id}] Trabalho cancelado antes de iniciar")
+            self._finalize(job)
+        else:
+            logger.info(f"[{job.id}] Cancelamento pedido, aguardando o próximo ponto de verificação")
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Contagem de trabalhos por status"""
+        with self._lock:
+            counts = {Job.QUEUED: 0, Job.RUNNING: 0, Job.COMPLETED: 0, Job.FAILED: 0, Job.CANCELLED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        counts['workers'] = len(self._workers)
+        return counts
+
+    def _purge_expired(self):
+        """Remove trabalhos finalizados há mais de job_ttl segundos"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at and now - job.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        for alias, target in list(self._aliases.items()):
+            if target not in self._jobs:
+                del self._aliases[alias]
+
+    def _finalize(self, job: Job):
+        job.finished_at = time.time()
+        JOBS_TOTAL.inc(status=job.status)
+        if job.started_at is not None:
+            JOB_SECONDS.observe(job.finished_at - job.started_at, status=job.status)
+        with self._lock:
+            if job.dedup_key and self._inflight.get(job.dedup_key) is job:
+                del self._inflight[job.dedup_key]
+        job.done.set()
+        if self.on_finish:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"[{job.id}] Erro no callback de finalização: {e}")
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                # Cancelado enquanto esperava na fila (já finalizado)
+                cancelled = job.finished
+                if not cancelled:
+                    job.status = Job.RUNNING
+            if cancelled:
+                self._queue.task_done()
+                continue
+            try:
+                job.started_at = time.time()
+                QUEUE_WAIT_SECONDS.observe(job.started_at - job.created_at)
+                logger.info(f"[{job.id}] Trabalho iniciado")
+
+                job.check_cancelled()
+                job.result = self.handler(job)
+                job.status = Job.COMPLETED
+                logger.info(f"[{job.id}] Trabalho concluído em {time.time() - job.started_at:.2f}s")
+            except JobCancelled:
+                job.status = Job.CANCELLED
+                logger.info(f"[{job.id}] Trabalho cancelado após {time.time() - job.started_at:.2f}s")
+            except Exception as e:
+                job.error = str(e)
+                job.status = Job.FAILED
+                logger.error(f"[{job.id}] Trabalho falhou: {e}")
+            finally:
+                self._finalize(job)
+                self._queue.task_done()
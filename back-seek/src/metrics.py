@@ -0,0 +1,250 @@
+import bisect
+import contextlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Limites (s) dos histogramas de duração: de etapas curtas (decodificação,
+# codificação de um stem) até separações de faixas longas
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Rótulos de {self.name} devem ser {self.labels}, recebidos {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monotônico, opcionalmente por rótulos"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Valor instantâneo lido de uma função no momento da coleta"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set_function(self, collect: Callable[[], object]):
+        """`collect` retorna um número ou, com rótulos, {(valores dos rótulos): número}"""
+        self._collect = collect
+
+    def _samples(self) -> List[str]:
+        if self._collect is None:
+            return []
+        try:
+            values = self._collect()
+        except Exception as e:
+            logger.warning(f"Falha ao coletar {self.name}: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class FunctionCounter(Gauge):
+    """Contador mantido por outro componente, lido de uma função na coleta"""
+
+    kind = 'counter'
+
+
+class Histogram(_Metric):
+    """Histograma cumulativo (buckets, soma e contagem), opcionalmente por rótulos"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Mede o bloco e registra a duração (também quando ele levanta exceção)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas exposto no formato de texto do Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica já registrada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, description, labels))
+
+    def function_counter(self, name: str, description: str, labels: Iterable[str] = ()) -> FunctionCounter:
+        return self._register(FunctionCounter(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# ------------------------------------------------------------
+# Métricas do serviço
+# ------------------------------------------------------------
+REGISTRY = MetricsRegistry()
+
+# Etapas: download, decode, separation, refinement, encoding
+STAGE_SECONDS = REGISTRY.histogram(
+    'backseek_stage_duration_seconds', 'Duração de cada etapa do processamento', labels=('stage',))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'backseek_queue_wait_seconds', 'Tempo que o trabalho esperou na fila até começar')
+JOB_SECONDS = REGISTRY.histogram(
+    'backseek_job_duration_seconds', 'Duração total dos trabalhos (do início ao fim)', labels=('status',))
+
+JOBS_TOTAL = REGISTRY.counter(
+    'backseek_jobs_total', 'Trabalhos finalizados por status', labels=('status',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'backseek_cache_requests_total', 'Consultas ao cache de resultados', labels=('result',))
+FAILURES = REGISTRY.counter(
+    'backseek_failures_total', 'Falhas por etapa', labels=('stage',))
+FALLBACKS = REGISTRY.counter(
+    'backseek_fallbacks_total', 'Caminhos alternativos usados após uma falha', labels=('kind',))
+
+JOBS_IN_FLIGHT = REGISTRY.gauge(
+    'backseek_jobs', 'Trabalhos na fila ou em execução', labels=('status',))
+MODEL_MEMORY_BYTES = REGISTRY.gauge(
+    'backseek_model_memory_bytes', 'Memória dos modelos residentes', labels=('model',))
+PROCESS_RSS_BYTES = REGISTRY.gauge(
+    'backseek_process_resident_memory_bytes', 'Memória residente (RSS) do processo')
+
+# Motor de inferência em lote (BatchInferenceEngine ou pool de processos)
+BATCH_MAX_SIZE = REGISTRY.gauge(
+    'backseek_batch_max_size', 'Máximo de segmentos por lote de inferência')
+BATCH_WINDOW_SECONDS = REGISTRY.gauge(
+    'backseek_batch_window_seconds', 'Espera máxima para completar um lote')
+BATCH_AVERAGE_SIZE = REGISTRY.gauge(
+    'backseek_batch_average_size', 'Segmentos por lote, em média')
+BATCH_IN_FLIGHT = REGISTRY.gauge(
+    'backseek_batch_in_flight', 'Segmentos enviados aos processos e ainda sem resultado')
+BATCHES_TOTAL = REGISTRY.function_counter(
+    'backseek_batches_total', 'Lotes de inferência executados')
+BATCH_SEGMENTS_TOTAL = REGISTRY.function_counter(
+    'backseek_batch_segments_total', 'Segmentos processados pelo motor em lote')
+BATCH_BUSY_SECONDS = REGISTRY.function_counter(
+    'backseek_batch_busy_seconds_total', 'Tempo de inferência do motor em lote')
+
+
+@contextlib.contextmanager
+def track_stage(stage: str):
+    """Registra a duração da etapa e, se ela levantar exceção, conta a falha"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        # Cancelamentos (JobCancelled) interrompem a etapa sem contar como falha
+        if getattr(e, 'counts_as_failure', True):
+            FAILURES.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
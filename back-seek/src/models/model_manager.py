@@ -1,17 +1,92 @@
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import torch
+from demucs.apply import BagOfModels
 from demucs.pretrained import get_model
 from ..utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Modelos pré-treinados do Demucs que podem ser pedidos por trabalho
+AVAILABLE_MODELS = [
+    'htdemucs', 'htdemucs_ft', 'htdemucs_6s', 'hdemucs_mmi',
+    'mdx', 'mdx_extra', 'mdx_q', 'mdx_extra_q',
+]
+
+
+# Precisões de inferência: float32, autocast bfloat16 e int8 dinâmico (CPU)
+PRECISIONS = ['fp32', 'bf16', 'int8']
+
+
+def _tensor_bytes(value) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        # Camadas quantizadas guardam (peso, bias) empacotados
+        return sum(_tensor_bytes(item) for item in value)
+    return 0
+
+
+def model_size_bytes(model) -> int:
+    """Memória ocupada pelos pesos e buffers do modelo (inclusive quantizados)"""
+    return sum(_tensor_bytes(value) for value in model.state_dict().values())
+
+
+def prepare_precision(model, precision: str, device: str):
+    """Prepara o modelo (uma vez, no carregamento) para a precisão pedida.
+
+    int8 quantiza dinamicamente as camadas lineares (transformer e projeções)
+    e só existe na CPU; bf16 marca o modelo para rodar sob autocast.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precisão desconhecida: {precision}. Opções: {', '.join(PRECISIONS)}")
+    if precision == 'int8':
+        if device != 'cpu':
+            raise ValueError("Quantização int8 dinâmica só é suportada na CPU")
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.inference_precision = precision
+    return model
+
+
+def inference_context(model, device: str):
+    """Contexto do forward: autocast bfloat16 para modelos em bf16, senão nada"""
+    if getattr(model, 'inference_precision', 'fp32') == 'bf16':
+        return torch.autocast(device_type=device.split(':')[0], dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
 class ModelManager:
-    """Gerencia o carregamento e uso do modelo Demucs"""
-    
-    def __init__(self):
-        self.model = None
+    """Registro de modelos Demucs carregados sob demanda.
+
+    Cada modelo é carregado no primeiro uso e fica residente enquanto couber no
+    orçamento de memória; acima dele, os menos usados recentemente são
+    descarregados (o modelo padrão só sai se for o único). Trabalhos que já têm
+    a referência de um modelo descarregado continuam usando-o até terminar.
+    """
+
+    def __init__(self, default_model: str = 'htdemucs', memory_budget_mb: int = 2048,
+                 available_models: Optional[List[str]] = None, precision: str = 'fp32'):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Precisão desconhecida: {precision}. Opções: {', '.join(PRECISIONS)}")
+        self.model_name = default_model
+        self.precision = precision
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.available_models = list(available_models or AVAILABLE_MODELS)
         self.device = self._get_device()
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        # Variantes de uma passada por (modelo, membro do bag): (bag completo, variante)
+        self._single_pass: Dict[Tuple[str, int], Tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._loads = 0
+        self._hits = 0
+        self._evictions = 0
         logger.info(f"Dispositivo selecionado: {self.device}")
-    
+
     def _get_device(self) -> str:
         """Determina o melhor dispositivo disponível (CUDA, MPS ou CPU)"""
         if torch.cuda.is_available():
@@ -20,20 +95,152 @@ class ModelManager:
             return "mps"
         else:
             return "cpu"
-    
+
+    @property
+    def model(self):
+        """Modelo padrão, se já estiver carregado"""
+        with self._lock:
+            return self._models.get(self.model_name)
+
+    def validate_model(self, model_name: Optional[str]):
+        """Levanta ValueError se o modelo não puder ser pedido"""
+        if model_name is not None and model_name not in self.available_models:
+            raise ValueError(f"Modelo desconhecido: {model_name}. Opções: {', '.join(self.available_models)}")
+
     def load_model(self, model_name: str = 'htdemucs') -> None:
-        """Carrega o modelo Demucs especificado"""
-        try:
-            logger.info(f"Carregando modelo: {model_name}")
-            self.model = get_model(model_name)
-            self.model.to(self.device)
-            logger.info("Modelo carregado com sucesso!")
-        except Exception as e:
-            logger.error(f"Erro ao carregar modelo: {e}")
-            raise
-    
-    def get_model(self):
-        """Retorna o modelo carregado"""
-        if self.model is None:
-            raise ValueError("Modelo não foi carregado. Chame load_model() primeiro.")
-        return self.model
\ No newline at end of file
+        """Carrega o modelo especificado e o torna o padrão"""
+        self.get_model(model_name)
+        self.model_name = model_name
+
+    def get_model(self, model_name: Optional[str] = None):
+        """Retorna o modelo pedido (ou o padrão), carregando-o se necessário"""
+        model_name = model_name or self.model_name
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is not None:
+                self._models.move_to_end(model_name)
+                self._hits += 1
+                return model
+            self.validate_model(model_name)
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Um carregamento por modelo; pedidos simultâneos esperam o mesmo resultado
+        with load_lock:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is not None:
+                    self._models.move_to_end(model_name)
+                    return model
+
+            try:
+                logger.info(f"Carregando modelo: {model_name}")
+                start = time.time()
+                model = get_model(model_name)
+                model.to(self.device)
+                model.eval()
+                model = prepare_precision(model, self.precision, self.device)
+            except Exception as e:
+                logger.error(f"Erro ao carregar modelo: {e}")
+                raise
+
+            size = model_size_bytes(model)
+            with self._lock:
+                self._models[model_name] = model
+                self._sizes[model_name] = size
+                self._loads += 1
+                self._evict(keep=model_name)
+            logger.info(f"Modelo {model_name} ({self.precision}) carregado em {time.time() - start:.2f}s "
+                        f"({size / 1024 / 1024:.0f} MB)")
+            return model
+
+    def get_single_pass_model(self, model_name: Optional[str] = None, stem: Optional[str] = None):
+        """Variante de uma passada do modelo: um único membro do bag, com os mesmos
+        pesos (ex.: prévias). Modelos de um único membro voltam como estão.
+
+        Em bags especializados (ex.: htdemucs_ft, um membro por fonte), o membro é
+        o de maior peso para `stem`; sem `stem`, o de maior peso total.
+        """
+        model_name = model_name or self.model_name
+        model = self.get_model(model_name)
+        members = getattr(model, 'models', ())
+        if len(members) <= 1:
+            return model
+        weights = getattr(model, 'weights', None) or [[1.0] * len(model.sources)] * len(members)
+        if stem in model.sources:
+            source = model.sources.index(stem)
+            index = max(range(len(members)), key=lambda i: weights[i][source])
+        else:
+            index = max(range(len(members)), key=lambda i: sum(weights[i]))
+        with self._lock:
+            parent, single = self._single_pass.get((model_name, index), (None, None))
+            # A variante vale enquanto o mesmo bag completo estiver residente
+            if parent is not model:
+                single = BagOfModels([members[index]])
+                single.inference_precision = getattr(model, 'inference_precision', 'fp32')
+                self._single_pass[(model_name, index)] = (model, single)
+            return single
+
+    def _drop_single_pass(self, model_name: str):
+        # Chamado com self._lock adquirido
+        for key in [key for key in self._single_pass if key[0] == model_name]:
+            del self._single_pass[key]
+
+    def _evict(self, keep: str):
+        # Chamado com self._lock adquirido
+        evicted = False
+        while sum(self._sizes.values()) > self.memory_budget and len(self._models) > 1:
+            candidates = [name for name in self._models if name != keep]
+            # O padrão é o último a sair
+            candidates.sort(key=lambda name: name == self.model_name)
+            victim = candidates[0]
+            del self._models[victim]
+            self._drop_single_pass(victim)
+            size = self._sizes.pop(victim)
+            self._evictions += 1
+            evicted = True
+            logger.info(f"Modelo {victim} descarregado ({size / 1024 / 1024:.0f} MB) para caber no orçamento")
+        if evicted and self.device == 'cuda':
+            torch.cuda.empty_cache()
+
+    def unload_model(self, model_name: str) -> bool:
+        """Remove um modelo do registro; retorna False se ele não estava carregado"""
+        with self._lock:
+            if self._models.pop(model_name, None) is None:
+                return False
+            self._sizes.pop(model_name, None)
+            self._drop_single_pass(model_name)
+        logger.info(f"Modelo {model_name} descarregado")
+        return True
+
+    def prewarm(self, model_names: Iterable[str]):
+        """Carrega antecipadamente os modelos indicados (na ordem dada)"""
+        for model_name in model_names:
+            self.get_model(model_name)
+
+    def resident_models(self) -> List[Any]:
+        """Instâncias dos modelos residentes (inclusive as variantes de uma passada)"""
+        with self._lock:
+            return list(self._models.values()) + [single for _, single in self._single_pass.values()]
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes ocupados por cada modelo residente"""
+        with self._lock:
+            return dict(self._sizes)
+
+    def loaded_models(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+    def stats(self) -> Dict[str, Any]:
+        """Modelos residentes (do menos ao mais usado recentemente) e contadores"""
+        with self._lock:
+            return {
+                'default': self.model_name,
+                'precision': self.precision,
+                'resident': {name: round(self._sizes[name] / 1024 / 1024, 1) for name in self._models},
+                'resident_mb': round(sum(self._sizes.values()) / 1024 / 1024, 1),
+                'budget_mb': round(self.memory_budget / 1024 / 1024, 1),
+                'loads': self._loads,
+                'hits': self._hits,
+                'evictions': self._evictions,
+            }
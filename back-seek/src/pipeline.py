@@ -0,0 +1,509 @@
+import contextlib
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .downloader import YouTubeDownloader
+from .separator import AudioSeparator
+from .vocal_refiner import VocalRefiner
+from .cache import ResultCache
+from .storage import StorageManager
+from .jobs import Job, JobCancelled, validate_job_id
+from .progress import ProgressBroker
+from .batch import AudioPrefetcher
+from .metrics import CACHE_REQUESTS, FALLBACKS, track_stage
+from . import config
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SeparationPipeline:
+    """Executa download, separação e refinamento de um trabalho"""
+
+    def __init__(self, downloader: YouTubeDownloader, separator: AudioSeparator,
+                 vocal_refiner: VocalRefiner, progress: ProgressBroker,
+                 cache: Optional[ResultCache] = None, storage: Optional[StorageManager] = None):
+        self.downloader = downloader
+        self.separator = separator
+        self.vocal_refiner = vocal_refiner
+        self.progress = progress
+        self.cache = cache
+        self.storage = storage
+
+    def _set_progress(self, job_id: str, value: float, **data):
+        self.progress.publish(job_id, value, **data)
+
+    @staticmethod
+    def processing_options(params: Dict[str, Any]) -> Dict[str, Any]:
+        """Normaliza as opções de processamento que afetam o resultado"""
+        refine = bool(params.get('refine_vocals', False))
+        two_stems = params.get('two_stems') or None
+        stems = sorted(set(params.get('stems') or [])) or None
+        output_format = params.get('format') or config.OUTPUT_FORMAT
+        bitrate = params.get('bitrate')
+        options = {
+            'refine_vocals': refine,
+            'stems': stems,
+            'two_stems': two_stems,
+            'format': output_format,
+            'bitrate': bitrate,
+        }
+        # Só pedidos de trecho levam start/end, mantendo as chaves de cache da faixa inteira
+        start, end = AudioSeparator.validate_range(params.get('start'), params.get('end'))
+        if start is not None or end is not None:
+            options['start'] = start
+            options['end'] = end
+        return options
+
+    def model_name(self, params: Dict[str, Any]) -> str:
+        """Modelo pedido pelo trabalho, ou o padrão do ModelManager"""
+        return params.get('model') or self.separator.model_manager.model_name
+
+    def dedup_key(self, params: Dict[str, Any]) -> str:
+        """Chave para coalescer pedidos idênticos em andamento (sem acesso à rede).
+
+        Não inclui `preview`: o resultado final (e a chave do cache) é o mesmo, e
+        um pedido com prévia anexado liga a prévia no trabalho em andamento.
+        """
+        video_id = self.downloader.quick_video_id(params['youtube_url'])
+        return ResultCache.make_key(
+            video_id,
+            self.model_name(params),
+            precision=self.separator.model_manager.precision,
+            **self.processing_options(params),
+        )
+
+    def _video_id(self, youtube_url: str) -> Optional[str]:
+        """Id canônico do vídeo (consulta a rede), ou None se não for possível obtê-lo"""
+        try:
+            info = self.downloader.get_video_info(youtube_url)
+            return self.downloader.canonical_video_id(info)
+        except Exception as e:
+            logger.warning(f"Não foi possível obter o id do vídeo, ignorando cache: {e}")
+            if self.cache is not None:
+                CACHE_REQUESTS.inc(result='error')
+            return None
+
+    @contextlib.contextmanager
+    def _workspace(self, job: Job):
+        """Workspace do trabalho (ou None, usando os diretórios padrão, sem StorageManager).
+
+        Se o trabalho for cancelado, os arquivos gravados nele são descartados
+        (só dentro da raiz do StorageManager).
+        """
+        if self.storage is None:
+            yield None
+            return
+        validate_job_id(job.id)
+        with self.storage.workspace(job.id) as workspace:
+            try:
+                yield workspace
+            except JobCancelled:
+                self.storage.discard(workspace)
+                raise
+
+    def _fetch_audio(self, youtube_url: str, progress_callback, keep_wav: bool = False,
+                     output_dir: Optional[Path] = None, options: Optional[Dict[str, Any]] = None,
+                     model_name: Optional[str] = None):
+        """Baixa e decodifica o áudio em memória; se falhar, usa o download com WAV em disco.
+
+        Em pedidos de trecho, decodifica só o trecho e o contexto em volta dele.
+        """
+        start = end = None
+        if options and ('start' in options or 'end' in options):
+            start, end = self.separator.decode_span(options.get('start'), options.get('end'), model_name)
+        audio = self.downloader.download_decoded(youtube_url, progress_callback=progress_callback,
+                                                 keep_wav=keep_wav, output_dir=output_dir,
+                                                 start=start, end=end)
+        if audio is None:
+            logger.warning("Decodificação em memória falhou, tentando download com conversão para WAV")
+            FALLBACKS.inc(kind='download_wav')
+            audio = self.downloader.download_audio(youtube_url, progress_callback=progress_callback,
+                                                   output_dir=output_dir)
+        if not audio:
+            raise Exception("Falha ao baixar áudio do YouTube")
+        return audio
+
+    def _lookup_cache(self, job_id: str, youtube_url: str, model_name: str, options: Dict[str, Any]
+                      ) -> Tuple[Optional[str], Optional[str], Optional[Dict[str, Any]]]:
+        """(id do vídeo, chave do cache, resultado em cache ou None).
+
+        O id do vídeo também identifica o áudio no cache de janelas do separador.
+        """
+        if self.cache is None and self.separator.window_cache is None:
+            return None, None, None
+        video_id = self._video_id(youtube_url)
+        if video_id is None or self.cache is None:
+            return video_id, None, None
+
+        cache_key = ResultCache.make_key(video_id, model_name,
+                                         precision=self.separator.model_manager.precision, **options)
+        cached = self.cache.get(cache_key)
+        CACHE_REQUESTS.inc(result='hit' if cached else 'miss')
+        if cached:
+            logger.info(f"[{job_id}] Resultado encontrado no cache")
+            cached['cached'] = True
+            return video_id, cache_key, cached
+        return video_id, cache_key, None
+
+    def run(self, job: Job) -> Dict[str, Any]:
+        """Handler da fila de trabalhos: processa um pedido de /api/separate"""
+        if job.params.get('stream') is not None:
+            return self.run_stream(job)
+        if job.params.get('urls') is not None:
+            return self.run_batch(job)
+
+        job_id = job.id
+        youtube_url = job.params['youtube_url']
+        options = self.processing_options(job.params)
+        model_name = self.model_name(job.params)
+
+        job.stage = 'download'
+        self._set_progress(job_id, 0, stage=job.stage)
+
+        source_id, cache_key, cached = self._lookup_cache(job_id, youtube_url, model_name, options)
+        if cached:
+            return cached
+
+        logger.info(f"[{job_id}] Baixando áudio… URL: {youtube_url}")
+
+        # Mapeia o progresso do download (0-100) para 0-30 do progresso total;
+        # chamado a cada fragmento, é também o ponto de cancelamento do download
+        def download_progress_hook(progress):
+            job.check_cancelled()
+            self._set_progress(job_id, progress * 0.3)
+            logger.info(f"[{job_id}] Progresso do download: {progress}%")
+
+        with self._workspace(job) as workspace:
+            audio_file = self._fetch_audio(
+                youtube_url,
+                download_progress_hook,
+                keep_wav=bool(job.params.get('keep_wav', config.KEEP_DECODED_WAV)),
+                output_dir=workspace,
+                options=options,
+                model_name=model_name,
+            )
+
+            report = lambda value, **data: self._set_progress(job_id, value, **data)
+            if job.params.get('preview'):
+                self._preview(job, audio_file, options, model_name, workspace)
+                # A separação completa continua em 40-100% do progresso total
+                report = lambda value, **data: self._set_progress(job_id, 40 + (value - 30) * 60 / 70, **data)
+
+            result = self._process_audio(
+                job, audio_file, options, model_name, cache_key, report,
+                output_dir=workspace, source_id=source_id,
+            )
+            if job.preview is not None:
+                result['quality'] = 'full'
+            return result
+
+    def _preview(self, job: Job, audio_file, options: Dict[str, Any], model_name: str,
+                 output_dir: Optional[Path] = None):
+        """Separa rapidamente o início do pedido (PREVIEW_SECONDS, uma passada e
+        menos sobreposição, sem refinamento) e publica o resultado como prévia.
+
+        Usa 30-40% do progresso total; uma falha na prévia não interrompe o trabalho.
+        """
+        job_id = job.id
+        start = options.get('start') or 0
+        end = start + config.PREVIEW_SECONDS
+        if options.get('end') is not None:
+            end = min(end, options['end'])
+        preview_model = config.PREVIEW_MODEL or model_name
+
+        job.check_cancelled()
+        job.stage = 'preview'
+        self._set_progress(job_id, 30, stage=job.stage)
+        logger.info(f"[{job_id}] Gerando prévia ({start:g}-{end:g}s, modelo {preview_model})…")
+
+        def preview_progress_hook(demucs_progress, details=None):
+            job.check_cancelled()
+            job.stage_details = details
+            self._set_progress(job_id, 30 + demucs_progress * 0.1, stage=job.stage, details=details)
+
+        try:
+            with track_stage('preview'):
+                files = self.separator.separate(
+                    audio_file,
+                    progress_callback=preview_progress_hook,
+                    stems=options['stems'],
+                    two_stems=options['two_stems'],
+                    refine_stem=options['two_stems'] or 'other',
+                    output_format=options['format'],
+                    bitrate=options['bitrate'],
+                    model_name=preview_model,
+                    output_dir=output_dir,
+                    start=start,
+                    end=end,
+                    overlap=config.PREVIEW_OVERLAP_PERCENT / 100,
+                    single_pass=True,
+                    name_suffix='_preview',
+                )
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"[{job_id}] Falha ao gerar a prévia, seguindo com a separação completa: {e}")
+            return
+
+        vocals_key = options['two_stems'] or 'other'
+        job.preview = {
+            'quality': 'preview',
+            'range': {'start': start, 'end': end},
+            'model': preview_model,
+            'separated': {k: str(v) for k, v in files.items()},
+            'vocals': str(files.get(vocals_key, '')),
+            'instrumental': str(files.get('drums', files.get(f"no_{vocals_key}", ''))),
+        }
+        job.stage_details = None
+        self._set_progress(job_id, 40, stage=job.stage, details=None, preview=job.preview)
+        logger.info(f"[{job_id}] Prévia pronta; separação completa segue em segundo plano")
+
+    def _process_audio(self, job: Job, audio_file, options: Dict[str, Any], model_name: str,
+                       cache_key: Optional[str], report: Callable[..., None],
+                       output_dir: Optional[Path] = None, source_id: Optional[str] = None) -> Dict[str, Any]:
+        """Separa (e refina) um áudio já baixado e armazena o resultado no cache.
+
+        `report(percentual, **dados)` recebe o progresso de 30 a 100; os
+        arquivos são gravados em `output_dir` (workspace do trabalho).
+        `source_id` identifica o áudio no cache de janelas do separador.
+        """
+        job_id = job.id
+        refine = options['refine_vocals']
+
+        job.check_cancelled()
+        job.stage = 'separation'
+        report(30, stage=job.stage)
+        logger.info(f"[{job_id}] Separando stems…")
+
+        # O progresso do Demucs já está em 0-100%, mapeamos para 30-80% do progresso total;
+        # chamado a cada segmento, é também o ponto de cancelamento da separação
+        def separation_progress_hook(demucs_progress, details=None):
+            job.check_cancelled()
+            total_progress = 30 + (demucs_progress * 0.5)
+            job.stage_details = details
+            report(total_progress, stage=job.stage, details=details)
+            if details:
+                logger.info(f"[{job_id}] Progresso do Demucs: segmento {details['chunks_done']}/{details['chunks_total']}, "
+                            f"ETA {details['eta_seconds']}s -> Progresso total: {total_progress:.1f}%")
+
+        # No seu pipeline, 'other' é a faixa de voz; no modo dois stems, o alvo
+        vocals_key = options['two_stems'] or 'other'
+
+        refiner = None
+        if refine:
+            # Mapeia o progresso do refinamento (0-100) para 80-100 do progresso total;
+            # chamado entre as etapas do refinamento, que param se o trabalho for cancelado
+            def refinement_progress_hook(progress):
+                job.check_cancelled()
+                report(80 + (progress * 0.2), stage=job.stage, details=None)
+                logger.info(f"[{job_id}] Progresso do refinamento: {progress}%")
+
+            # O stem vai da saída do separador direto para o refinador, sem MP3 intermediário
+            def refiner(audio, samplerate, output_path):
+                job.check_cancelled()
+                job.stage = 'refinement'
+                job.stage_details = None
+                logger.info(f"[{job_id}] Refinando vocais…")
+                return self.vocal_refiner.refine_to_file(
+                    audio, samplerate, output_path,
+                    progress_callback=refinement_progress_hook
+                )
+
+        separated_files = self.separator.separate(
+            audio_file,
+            progress_callback=separation_progress_hook,
+            stems=options['stems'],
+            two_stems=options['two_stems'],
+            refine_stem=vocals_key,
+            refiner=refiner,
+            output_format=options['format'],
+            bitrate=options['bitrate'],
+            model_name=model_name,
+            output_dir=output_dir,
+            start=options.get('start'),
+            end=options.get('end'),
+            source_id=source_id,
+        )
+
+        if refine and 'vocals_refined' in separated_files:
+            vocals_display = str(separated_files['vocals_refined'])
+        else:
+            vocals_display = str(separated_files.get(vocals_key, ''))
+
+        result = {
+            'original': str(audio_file),
+            'separated': {k: str(v) for k, v in separated_files.items()},
+            'vocals': vocals_display,
+            'instrumental': str(separated_files.get('drums', separated_files.get(f"no_{vocals_key}", '')))
+        }
+        if 'start' in options or 'end' in options:
+            result['range'] = {'start': options.get('start') or 0, 'end': options.get('end')}
+
+        if cache_key:
+            try:
+                result = self.cache.put(cache_key, result, separated_files)
+            except Exception as e:
+                logger.warning(f"[{job_id}] Falha ao armazenar no cache: {e}")
+
+        result['cached'] = False
+        return result
+
+    def expand_urls(self, urls: List[str], playlist_url: Optional[str] = None) -> List[str]:
+        """URLs do lote mais os vídeos da playlist, sem repetições e até o limite"""
+        expanded = list(urls)
+        if playlist_url:
+            expanded.extend(self.downloader.expand_playlist(playlist_url))
+        expanded = list(dict.fromkeys(expanded))
+        if len(expanded) > config.MAX_BATCH_URLS:
+            logger.warning(f"Lote com {len(expanded)} URLs, processando as primeiras {config.MAX_BATCH_URLS}")
+            expanded = expanded[:config.MAX_BATCH_URLS]
+        return expanded
+
+    def run_batch(self, job: Job) -> Dict[str, Any]:
+        """Processa um lote (/api/batch): baixa os próximos itens enquanto separa o atual.
+
+        O progresso publicado é a média dos itens; os detalhes trazem o estado
+        de cada item. Um item com falha não interrompe o lote; o cancelamento
+        do trabalho interrompe o lote inteiro.
+        """
+        job_id = job.id
+        options = self.processing_options(job.params)
+        model_name = self.model_name(job.params)
+        keep_wav = bool(job.params.get('keep_wav', config.KEEP_DECODED_WAV))
+
+        job.stage = 'download'
+        self._set_progress(job_id, 0, stage=job.stage)
+        urls = self.expand_urls(job.params['urls'], job.params.get('playlist_url'))
+        if not urls:
+            raise ValueError("Lote sem URLs")
+
+        items = [{'url': url, 'status': 'pending', 'progress': 0.0} for url in urls]
+        lock = threading.Lock()
+
+        def publish():
+            with lock:
+                summary = {
+                    'total': len(items),
+                    'completed': sum(item['status'] == 'completed' for item in items),
+                    'failed': sum(item['status'] == 'failed' for item in items),
+                    'items': [{k: v for k, v in item.items() if k != 'result'} for item in items],
+                }
+                percent = sum(item['progress'] for item in items) / len(items)
+            job.stage_details = summary
+            self._set_progress(job_id, percent, stage=job.stage, details=summary)
+
+        def update(index: int, progress: Optional[float] = None, **fields):
+            with lock:
+                if progress is not None:
+                    items[index]['progress'] = round(progress, 2)
+                items[index].update(fields)
+            publish()
+
+        def fetch(index: int, url: str):
+            update(index, status='downloading')
+            source_id, cache_key, cached = self._lookup_cache(job_id, url, model_name, options)
+            if cached:
+                return source_id, cache_key, cached
+            def download_progress_hook(progress):
+                job.check_cancelled()
+                update(index, progress * 0.3)
+
+            audio = self._fetch_audio(url, download_progress_hook, keep_wav=keep_wav, output_dir=workspace,
+                                      options=options, model_name=model_name)
+            update(index, 30, status='downloaded')
+            return source_id, cache_key, audio
+
+        logger.info(f"[{job_id}] Lote com {len(urls)} item(ns), pré-carregando até {config.PREFETCH_DEPTH}")
+        # O prefetcher fecha (e espera a thread de download) antes de o workspace
+        # ser descartado em um cancelamento
+        with self._workspace(job) as workspace, \
+                AudioPrefetcher(fetch, urls, depth=config.PREFETCH_DEPTH) as prefetcher:
+            for index, url, value, error in prefetcher:
+                job.check_cancelled()
+                if error is None:
+                    source_id, cache_key, audio = value
+                    try:
+                        if isinstance(audio, dict):
+                            result = audio
+                        else:
+                            update(index, status='separating')
+                            logger.info(f"[{job_id}] Item {index + 1}/{len(urls)}: {url}")
+                            result = self._process_audio(
+                                job, audio, options, model_name, cache_key,
+                                lambda value, details=None, **data: update(index, value, details=details),
+                                output_dir=workspace, source_id=source_id,
+                            )
+                    except JobCancelled:
+                        raise
+                    except Exception as e:
+                        error = e
+                if error is None:
+                    update(index, 100, status='completed', result=result, details=None)
+                else:
+                    logger.error(f"[{job_id}] Item {index + 1}/{len(urls)} falhou: {error}")
+                    update(index, 100, status='failed', error=str(error), details=None)
+
+        completed = sum(item['status'] == 'completed' for item in items)
+        if completed == 0:
+            raise Exception("Nenhum item do lote foi processado")
+        return {
+            'total': len(items),
+            'completed': completed,
+            'failed': len(items) - completed,
+            'items': [
+                {'url': item['url'], 'status': item['status'],
+                 'result': item.get('result'), 'error': item.get('error')}
+                for item in items
+            ],
+        }
+
+    def run_stream(self, job: Job) -> Dict[str, Any]:
+        """Processa um pedido de /api/stream, enviando cada segmento separado ao cliente"""
+        job_id = job.id
+        stream = job.params['stream']
+        stem = job.params.get('stem', 'other')
+        error = None
+
+        try:
+            job.stage = 'download'
+            self._set_progress(job_id, 0, stage=job.stage)
+            logger.info(f"[{job_id}] Baixando áudio para streaming… URL: {job.params['youtube_url']}")
+
+            def separation_progress_hook(demucs_progress, details=None):
+                job.check_cancelled()
+                job.stage_details = details
+                self._set_progress(job_id, 30 + demucs_progress * 0.7, stage=job.stage, details=details)
+
+            def download_progress_hook(progress):
+                job.check_cancelled()
+                self._set_progress(job_id, progress * 0.3)
+
+            with self._workspace(job) as workspace:
+                # WAV em disco, lido segmento a segmento (memmap): a memória não cresce
+                # com a duração da faixa, ao contrário da decodificação em memória
+                audio_file = self.downloader.download_audio(
+                    job.params['youtube_url'],
+                    progress_callback=download_progress_hook,
+                    output_dir=workspace,
+                )
+                if not audio_file:
+                    raise Exception("Falha ao baixar áudio do YouTube")
+
+                job.stage = 'separation'
+                self._set_progress(job_id, 30, stage=job.stage)
+
+                for block in self.separator.separate_stream(
+                    audio_file,
+                    stem=stem,
+                    progress_callback=separation_progress_hook,
+                    model_name=job.params.get('model'),
+                ):
+                    stream.push(block)
+
+            return {'original': str(audio_file), 'stream': stem}
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            stream.finish(error)
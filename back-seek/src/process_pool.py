@@ -0,0 +1,224 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+import torch
+import torch.multiprocessing as mp
+from demucs.apply import apply_model
+from .models.model_manager import inference_context
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _worker_main(index: int, cores: Optional[List[int]], threads: int, tasks, results):
+    """Laço de um processo de inferência: recebe modelos e segmentos pela fila"""
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+
+    models = {}
+    while True:
+        message = tasks.get()
+        kind = message[0]
+        if kind == 'stop':
+            return
+        if kind == 'load':
+            # Os pesos chegam como referências à memória compartilhada, sem cópia
+            _, key, model = message
+            models[key] = model
+            continue
+        if kind == 'unload':
+            models.pop(message[1], None)
+            continue
+
+        _, task_id, key, chunk = message
+        try:
+            model = models[key]
+            with torch.no_grad(), inference_context(model, 'cpu'):
+                out = apply_model(model, chunk.unsqueeze(0), device='cpu', shifts=0, split=False)
+            # O tensor de saída volta pela memória compartilhada
+            results.put((task_id, out[0].float(), None))
+        except Exception as e:
+            results.put((task_id, None, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, index: int, cores: Optional[List[int]]):
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.tasks = None
+        self.loaded = set()
+        self.pending = set()
+
+
+class ProcessInferencePool:
+    """Executa os segmentos em N processos que compartilham os pesos do modelo.
+
+    O modelo é movido para memória compartilhada (share_memory) e enviado uma
+    vez a cada processo; segmentos e saídas trafegam como tensores em memória
+    compartilhada, sem serializar os dados. Cada processo fica preso a um
+    subconjunto de núcleos e usa `threads` threads do torch.
+
+    Tem a mesma interface do BatchInferenceEngine (submit -> Future, max_batch),
+    então o AudioSeparator pode usar qualquer um dos dois.
+    """
+
+    def __init__(self, num_workers: int, threads_per_worker: int = 0, model_manager=None):
+        self.num_workers = max(1, num_workers)
+        self.model_manager = model_manager
+        self._ctx = mp.get_context('spawn')
+        self._results = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._futures: Dict[int, Future] = {}
+        self._task_worker: Dict[int, _Worker] = {}
+        self._models: Dict[int, Any] = {}
+        self._segments = 0
+        self._busy_total = 0.0
+        self._restarts = 0
+        self._closing = threading.Event()
+
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+        per_worker = max(1, len(cores) // self.num_workers)
+        self.threads = threads_per_worker or per_worker
+
+        self._workers = []
+        for index in range(self.num_workers):
+            subset = cores[index * per_worker:(index + 1) * per_worker] if len(cores) >= self.num_workers else None
+            worker = _Worker(index, subset)
+            self._start(worker)
+            self._workers.append(worker)
+
+        # Lote máximo em voo: mantém todos os processos ocupados
+        self.max_batch = self.num_workers
+
+        self._collector = threading.Thread(target=self._collect, name="process-pool-results", daemon=True)
+        self._collector.start()
+        logger.info(f"Pool de processos iniciado ({self.num_workers} processos, {self.threads} thread(s) cada)")
+
+    def _start(self, worker: _Worker):
+        worker.tasks = self._ctx.Queue()
+        worker.loaded = set()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.index, worker.cores, self.threads, worker.tasks, self._results),
+            name=f"inference-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    def _prune(self, worker: _Worker):
+        # Chamado com self._lock adquirido: descarta modelos que saíram do registro
+        if self.model_manager is None:
+            return
+        resident = {id(model) for model in self.model_manager.resident_models()}
+        for key in list(worker.loaded):
+            if key not in resident:
+                worker.tasks.put(('unload', key))
+                worker.loaded.discard(key)
+        for key in list(self._models):
+            if key not in resident and not any(key in w.loaded for w in self._workers):
+                del self._models[key]
+
+    def submit(self, model, chunk: torch.Tensor) -> Future:
+        """Enfileira um segmento [canais, samples]; o Future recebe [fontes, canais, samples]"""
+        future = Future()
+        key = id(model)
+        with self._lock:
+            worker = min(self._workers, key=lambda w: len(w.pending))
+            if key not in worker.loaded:
+                self._prune(worker)
+                if key not in self._models:
+                    # Uma cópia dos pesos em memória compartilhada para todos os processos
+                    model.share_memory()
+                    self._models[key] = model
+                worker.tasks.put(('load', key, model))
+                worker.loaded.add(key)
+
+            task_id = next(self._task_ids)
+            self._futures[task_id] = future
+            self._task_worker[task_id] = worker
+            worker.pending.add(task_id)
+            future.submitted_at = time.monotonic()
+            worker.tasks.put(('run', task_id, key, chunk.contiguous()))
+        return future
+
+    def _collect(self):
+        while not self._closing.is_set():
+            try:
+                task_id, out, error = self._results.get(timeout=1)
+            except queue.Empty:
+                self._check_workers()
+                continue
+
+            with self._lock:
+                future = self._futures.pop(task_id, None)
+                worker = self._task_worker.pop(task_id, None)
+                if worker is not None:
+                    worker.pending.discard(task_id)
+                if future is not None:
+                    self._segments += 1
+                    self._busy_total += time.monotonic() - future.submitted_at
+            if future is None:
+                continue
+            if error is None:
+                # Copia para memória comum e libera o segmento compartilhado
+                future.set_result(out.clone())
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _check_workers(self):
+        """Reinicia processos que morreram, falhando os segmentos que estavam neles"""
+        with self._lock:
+            if self._closing.is_set():
+                return
+            for worker in self._workers:
+                if worker.process.is_alive():
+                    continue
+                logger.error(f"Processo de inferência {worker.index} terminou (código {worker.process.exitcode}); reiniciando")
+                for task_id in worker.pending:
+                    future = self._futures.pop(task_id, None)
+                    self._task_worker.pop(task_id, None)
+                    if future is not None:
+                        future.set_exception(RuntimeError("Processo de inferência terminou inesperadamente"))
+                worker.pending = set()
+                self._restarts += 1
+                self._start(worker)
+
+    def close(self):
+        """Encerra os processos e o coletor, sem reiniciar nenhum processo"""
+        with self._lock:
+            self._closing.set()
+            for worker in self._workers:
+                worker.tasks.put(('stop',))
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+        self._collector.join(timeout=5)
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+            self._task_worker.clear()
+            for worker in self._workers:
+                worker.pending = set()
+        for future in futures:
+            future.set_exception(RuntimeError("Pool de processos encerrado"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'mode': 'process',
+                'workers': self.num_workers,
+                'threads_per_worker': self.threads,
+                'cores': [worker.cores for worker in self._workers],
+                'max_batch': self.max_batch,
+                'segments': self._segments,
+                'in_flight': sum(len(worker.pending) for worker in self._workers),
+                'shared_models': len(self._models),
+                'restarts': self._restarts,
+                'busy_seconds': self._busy_total,
+            }
@@ -0,0 +1,193 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class SegmentProgress:
+    """Progresso de uma separação, contado por segmentos processados.
+
+    Cada separação tem o seu próprio objeto, sem estado global. O callback
+    recebe (percentual, detalhes), onde detalhes traz segmentos concluídos,
+    total de segmentos e a estimativa de tempo restante.
+    """
+
+    def __init__(self, total: int, callback: Optional[Callable[[int, Dict[str, Any]], None]] = None):
+        self.total = max(1, total)
+        self.done = 0
+        self.callback = callback
+        self.started_at = time.monotonic()
+
+    @property
+    def percent(self) -> int:
+        return int(self.done * 100 / self.total)
+
+    def eta_seconds(self) -> Optional[float]:
+        """Tempo restante estimado pela média dos segmentos já processados"""
+        if self.done == 0:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return elapsed / self.done * (self.total - self.done)
+
+    def snapshot(self) -> Dict[str, Any]:
+        eta = self.eta_seconds()
+        return {
+            'chunks_done': self.done,
+            'chunks_total': self.total,
+            'elapsed_seconds': round(time.monotonic() - self.started_at, 2),
+            'eta_seconds': round(eta, 2) if eta is not None else None,
+        }
+
+    def advance(self, count: int = 1):
+        self.done = min(self.total, self.done + count)
+        if self.callback:
+            self.callback(self.percent, self.snapshot())
+
+
+class _ProgressState:
+    """Último estado conhecido do progresso de um trabalho"""
+
+    def __init__(self, lock: threading.Lock):
+        self.cond = threading.Condition(lock)
+        self.seq = 0
+        self.percent = 0.0
+        self.data: Dict[str, Any] = {}
+        self.status = 'pending'
+        self.error = None
+        self.finished = False
+        self.subscribers = 0
+        self.updated_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'id': self.seq,
+            'percent': self.percent,
+            'status': self.status,
+            'error': self.error,
+            'finished': self.finished,
+            **self.data,
+        }
+
+
+class ProgressBroker:
+    """Distribui o progresso dos trabalhos para assinantes SSE.
+
+    As atualizações são empurradas aos assinantes assim que publicadas (sem
+    polling). Cada trabalho aceita vários assinantes; quem reconecta com
+    Last-Event-ID recebe o estado mais recente. Trabalhos finalizados expiram
+    após `ttl` segundos sem assinantes.
+
+    `on_abandoned(job_id)` é chamado quando o último assinante de um trabalho
+    ainda não finalizado se desconecta (ex.: para cancelá-lo).
+    """
+
+    def __init__(self, ttl: float = 600, keepalive: float = 15,
+                 on_abandoned: Optional[Callable[[str], None]] = None):
+        self.ttl = ttl
+        self.keepalive = keepalive
+        self.on_abandoned = on_abandoned
+        self._lock = threading.Lock()
+        self._states: Dict[str, _ProgressState] = {}
+
+    def _state(self, job_id: str) -> _ProgressState:
+        # Chamado com self._lock adquirido
+        state = self._states.get(job_id)
+        if state is None:
+            self._purge_expired()
+            state = _ProgressState(self._lock)
+            self._states[job_id] = state
+        return state
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, state in self._states.items()
+            if state.subscribers == 0 and now - state.updated_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._states[job_id]
+
+    def publish(self, job_id: str, percent: float, **data):
+        """Publica um novo percentual (e dados extras, como etapa e detalhes)"""
+        with self._lock:
+            state = self._state(job_id)
+            if state.finished:
+                # Um trabalho reenviado com o mesmo id recomeça do zero
+                state.finished = False
+                state.error = None
+                state.data = {}
+            state.seq += 1
+            state.percent = round(float(percent), 2)
+            state.status = 'running'
+            state.data.update(data)
+            state.updated_at = time.time()
+            state.cond.notify_all()
+
+    def finish(self, job_id: str, status: str = 'completed', error: str = None):
+        """Marca o trabalho como finalizado e encerra os streams dos assinantes"""
+        with self._lock:
+            state = self._state(job_id)
+            state.seq += 1
+            state.percent = 100.0
+            state.status = status
+            state.error = error
+            state.finished = True
+            state.updated_at = time.time()
+            state.cond.notify_all()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._states.get(job_id)
+            return state.snapshot() if state else None
+
+    def subscribers(self, job_id: str) -> int:
+        with self._lock:
+            state = self._states.get(job_id)
+            return state.subscribers if state else 0
+
+    def clear(self):
+        with self._lock:
+            for state in self._states.values():
+                state.cond.notify_all()
+            self._states = {job_id: state for job_id, state in self._states.items() if state.subscribers}
+
+    def subscribe(self, job_id: str, last_event_id: Optional[str] = None) -> Iterator[Optional[Dict[str, Any]]]:
+        """Gera snapshots do progresso à medida que mudam.
+
+        Gera None a cada `keepalive` segundos sem novidades. Termina após enviar
+        o estado final do trabalho.
+        """
+        try:
+            last_seen = int(last_event_id) if last_event_id is not None else -1
+        except ValueError:
+            last_seen = -1
+
+        with self._lock:
+            state = self._state(job_id)
+            state.subscribers += 1
+            # Id de outro processo (ex.: servidor reiniciado): reenvia o estado atual
+            if last_seen > state.seq:
+                last_seen = -1
+
+        try:
+            while True:
+                with self._lock:
+                    if state.seq <= last_seen and not state.finished:
+                        state.cond.wait(timeout=self.keepalive)
+                    if state.seq <= last_seen:
+                        if state.finished:
+                            return
+                        snapshot = None
+                    else:
+                        snapshot = state.snapshot()
+                        last_seen = state.seq
+
+                yield snapshot
+                if snapshot is not None and snapshot['finished']:
+                    return
+        finally:
+            with self._lock:
+                state.subscribers -= 1
+                state.updated_at = time.time()
+                abandoned = state.subscribers == 0 and not state.finished
+            if abandoned and self.on_abandoned:
+                self.on_abandoned(job_id)
@@ -1,158 +1,611 @@
 import torch
+import torch.nn.functional as F
 from demucs.apply import apply_model
 from pathlib import Path
-from typing import Dict, Callable
+from typing import Dict, Callable, Iterator, List, Optional, Tuple, Union
 from .utils.logger import setup_logger
-from .models.model_manager import ModelManager
+from .models.model_manager import ModelManager, inference_context
+from .inference import BatchInferenceEngine
+from .encoder import StemEncoder
+from .window_cache import WindowCache
+from .progress import SegmentProgress
+from .utils.audio_io import DecodedAudio, wav_memmap, to_stereo_channels_first
+from .utils.memory import peak_rss_mb
+from .stems import STEM_NAMES, stem_names, validate_stems
+from .metrics import FALLBACKS, track_stage
+from .jobs import JobCancelled
+from functools import lru_cache
+from concurrent.futures import Future, wait
+from collections import deque
 import soundfile as sf
 import numpy as np
 import torchaudio
+import contextlib
+import threading
+import math
 import time
-import re
-import sys
-from io import StringIO
 
 logger = setup_logger(__name__)
 
-class DemucsProgressCapture(StringIO):
-    """Captura a saída do Demucs e extrai o progresso real"""
-    def __init__(self, progress_callback=None):
-        super().__init__()
-        self.progress_callback = progress_callback
-        self.buffer = ""
-        
-    def write(self, text):
-        self.buffer += text
-        # Processa o buffer para encontrar o progresso
-        self._process_buffer()
-        
-    def _process_buffer(self):
-        """Processa o buffer para extrair o progresso da barra do Demucs"""
-        lines = self.buffer.split('\r')
-        if lines:
-            last_line = lines[-1].strip()
-            
-            # Padrão da barra de progresso do Demucs: "XX%|█████| XXX/XXX [XX:XX<XX:XX, X.XXs/it]"
-            progress_match = re.search(r'(\d+)%\|', last_line)
-            if progress_match:
-                progress = int(progress_match.group(1))
-                if self.progress_callback:
-                    self.progress_callback(progress)
-            
-            # Também loga a linha completa
-            if last_line and '%|' in last_line:
-                logger.info(f"Demucs: {last_line}")
-                
-        # Limpa o buffer se ficar muito grande
-        if len(self.buffer) > 1000:
-            self.buffer = ""
+# Sobreposição padrão entre segmentos (a mesma do apply_model)
+OVERLAP = 0.25
+
+
+@lru_cache(maxsize=8)
+def _get_resampler(orig_freq: int, new_freq: int):
+    """Resampler com kernel em cache por (taxa de origem, taxa do modelo)"""
+    from torchaudio.transforms import Resample
+    return Resample(orig_freq, new_freq)
 
 class AudioSeparator:
     
-    def __init__(self, model_manager: ModelManager, output_dir: Path = Path("separated")):
+    def __init__(self, model_manager: ModelManager, output_dir: Path = Path("separated"),
+                 batch_engine: Optional[BatchInferenceEngine] = None,
+                 encoder: Optional[StemEncoder] = None, inference_slots: int = 1,
+                 window_cache: Optional[WindowCache] = None, window_seconds: float = 30,
+                 context_seconds: float = 8):
         self.model_manager = model_manager
         self.output_dir = output_dir
+        # Motor de inferência: BatchInferenceEngine ou ProcessInferencePool
+        self.batch_engine = batch_engine
+        self.encoder = encoder or StemEncoder(workers=1)
+        # Sem o motor em lote, limita quantos trabalhos rodam o modelo ao mesmo
+        # tempo; a codificação fica fora do limite e se sobrepõe ao próximo trabalho
+        self._inference_slots = threading.Semaphore(max(1, inference_slots))
+        # Trechos: janelas de tamanho fixo em cache e contexto extra em cada borda
+        self.window_cache = window_cache
+        self.window_seconds = window_seconds
+        self.context_seconds = context_seconds
         self.output_dir.mkdir(exist_ok=True)
     
-    def _load_audio(self, audio_path: Path):
+    def _load_audio(self, audio_path: Path, model):
+        """Carrega o áudio inteiro como tensor float32 [2, samples] na taxa do modelo.
+
+        WAVs PCM16/float32 são mapeados em memória e copiados uma única vez já no
+        formato [canais, samples]; os demais formatos são lidos direto em float32.
+        """
         try:
             logger.info(f"Carregando áudio: {audio_path}")
-            
-            try:
-                data, sr = sf.read(str(audio_path))
-                logger.info(f"Soundfile carregou: {data.shape}, SR: {sr}")
-            except Exception as e:
-                logger.warning(f"Soundfile falhou: {e}, tentando torchaudio")
-                wav, sr = torchaudio.load(str(audio_path))
-                data = wav.numpy().squeeze()
-            
-            if data.ndim == 1:
-                logger.info("Convertendo mono para estéreo")
-                data = np.stack([data, data], axis=1)  # [samples, 2]
-            elif data.ndim == 2 and data.shape[1] == 2:
-                logger.info("Áudio já é estéreo - mantendo")
-            elif data.ndim == 2 and data.shape[1] > 2:
-                logger.info(f"Convertendo {data.shape[1]} canais para estéreo")
-                data = data.mean(axis=1, keepdims=True)  # Primeiro converte para mono
-                data = np.repeat(data, 2, axis=1)  # Depois converte para estéreo
-            
-            data = data.astype(np.float32)
-            
+            rss_before = peak_rss_mb()
+
+            mapped = wav_memmap(audio_path)
+            if mapped is not None:
+                data, sr = mapped
+                logger.info(f"WAV mapeado em memória: {data.shape}, SR: {sr}")
+            else:
+                try:
+                    data, sr = sf.read(str(audio_path), dtype='float32', always_2d=True)
+                    logger.info(f"Soundfile carregou: {data.shape}, SR: {sr}")
+                except Exception as e:
+                    logger.warning(f"Soundfile falhou: {e}, tentando torchaudio")
+                    FALLBACKS.inc(kind='torchaudio_load')
+                    wav, sr = torchaudio.load(str(audio_path))
+                    data = wav.numpy().T  # [samples, canais], sem cópia
+
+            if data.shape[1] != 2:
+                logger.info(f"Convertendo {data.shape[1]} canal(is) para estéreo")
+
             # Converte para tensor do PyTorch no formato [canais, samples]
-            wav = torch.from_numpy(data).float().transpose(0, 1)  # [2, samples]
-            
-            # Resample se necessário
-            model = self.model_manager.get_model()
+            wav = torch.from_numpy(to_stereo_channels_first(data))
+            del data
+
+            # Resample se necessário, reaproveitando o kernel em cache
             if sr != model.samplerate:
-                from torchaudio.transforms import Resample
-                resampler = Resample(sr, model.samplerate)
-                wav = resampler(wav)
-            
-            logger.info(f"Áudio carregado: {wav.shape}, SR: {model.samplerate}")
+                wav = _get_resampler(sr, model.samplerate)(wav)
+
+            logger.info(f"Áudio carregado: {wav.shape}, SR: {model.samplerate}, "
+                        f"pico de RSS: {rss_before:.0f} MB -> {peak_rss_mb():.0f} MB")
             return wav
             
         except Exception as e:
             logger.error(f"Erro ao carregar áudio: {e}")
             raise
     
-    def separate(self, audio_path: Path, progress_callback: Callable = None) -> Dict[str, Path]:
+    # Mantido como método para quem já valida pelo separador
+    validate_stems = staticmethod(validate_stems)
+
+    @staticmethod
+    def _output_names(stems: Optional[List[str]] = None, two_stems: Optional[str] = None,
+                      names: List[str] = STEM_NAMES) -> List[str]:
+        """Nomes das saídas gravadas, na ordem de _select_outputs"""
+        if two_stems:
+            return [two_stems, f"no_{two_stems}"]
+        return list(dict.fromkeys(stems or names))
+
+    @staticmethod
+    def validate_range(start=None, end=None) -> Tuple[Optional[float], Optional[float]]:
+        """Normaliza o trecho [start, end) em segundos (ValueError se inválido)"""
+        try:
+            start = float(start) if start is not None else None
+            end = float(end) if end is not None else None
+        except (TypeError, ValueError):
+            raise ValueError('start e end devem ser números (segundos)')
+        if start is not None and (start < 0 or not math.isfinite(start)):
+            raise ValueError('start deve ser maior ou igual a zero')
+        if end is not None and (end <= (start or 0) or not math.isfinite(end)):
+            raise ValueError('end deve ser maior que start')
+        return (start or None), end
+
+    def _context_frames(self, model, overlap: float = OVERLAP) -> Tuple[int, int]:
+        """(contexto, passo da grade de segmentos) em samples; o contexto cobre ao menos um segmento"""
+        segment = self._segment_length(model)
+        return max(int(self.context_seconds * model.samplerate), segment), int((1 - overlap) * segment)
+
+    def decode_span(self, start: Optional[float] = None, end: Optional[float] = None,
+                    model_name: Optional[str] = None) -> Tuple[float, Optional[float]]:
+        """Trecho (s) a decodificar para separar [start, end): com o contexto das
+        bordas (e a folga até a grade de segmentos) e, com o cache de janelas,
+        estendido até as janelas inteiras"""
+        model = self.model_manager.get_model(model_name)
+        context, stride = self._context_frames(model)
+        sr = model.samplerate
+        start = start or 0.0
+        if self.window_cache is not None:
+            start = math.floor(start / self.window_seconds) * self.window_seconds
+            if end is not None:
+                end = math.ceil(end / self.window_seconds) * self.window_seconds
+        begin = max(0, int(start * sr) - context - stride)
+        return begin / sr, (end + context / sr if end is not None else None)
+
+    def _separate_segmented(self, model, audio_path: Union[Path, DecodedAudio], stems: Optional[List[str]],
+                            two_stems: Optional[str], progress_callback: Callable = None,
+                            start: Optional[float] = None, end: Optional[float] = None,
+                            source_id: Optional[str] = None, model_name: Optional[str] = None,
+                            overlap: float = OVERLAP) -> Dict[str, torch.Tensor]:
+        """Separa o arquivo inteiro, ou o trecho [start, end) em segundos, pelo laço de segmentos.
+
+        Com o cache de janelas e `source_id` (id estável do áudio), o pedido é
+        coberto por janelas alinhadas ao início da faixa: as já calculadas vêm do
+        cache e só as que faltam passam pelo modelo (apenas com a sobreposição padrão).
+        """
+        names = self._output_names(stems, two_stems, stem_names(num_sources=len(model.sources)))
+
+        def select(sources: torch.Tensor) -> torch.Tensor:
+            return torch.stack(list(self._select_outputs(sources, stems, two_stems).values()))
+
+        use_windows = self.window_cache is not None and source_id is not None and overlap == OVERLAP
+        length, read, close = self._open_reader(audio_path, model)
+        try:
+            if start is None and end is None and not use_windows:
+                blocks = [block for _, block in self._iter_separated(model, read, length, select, overlap,
+                                                                     progress_callback=progress_callback)]
+                separated = torch.cat(blocks, dim=-1)
+            else:
+                # Posições absolutas na faixa; um trecho decodificado começa em audio.start
+                sr = model.samplerate
+                base = round(audio_path.start * sr) if isinstance(audio_path, DecodedAudio) else 0
+                bounds = (base, base + length)
+                begin = max(base, round((start or 0) * sr))
+                stop = min(bounds[1], round(end * sr)) if end is not None else bounds[1]
+                if begin >= stop:
+                    raise ValueError(f"Trecho fora da duração do áudio ({bounds[1] / sr:.1f}s)")
+
+                def read_absolute(offset: int, frames: int) -> torch.Tensor:
+                    return read(offset - base, frames)
+
+                if use_windows:
+                    reaches_end = audio_path.reaches_end if isinstance(audio_path, DecodedAudio) else True
+                    separated = self._separate_windows(
+                        model, read_absolute, bounds, begin, stop, select, progress_callback,
+                        source_id, model_name or self.model_manager.model_name, reaches_end,
+                    )
+                else:
+                    separated = self._separate_span(model, read_absolute, bounds, begin, stop, select,
+                                                    progress_callback, overlap)
+        finally:
+            close()
+
+        return dict(zip(names, separated))
+
+    def _separate_span(self, model, read: Callable[[int, int], torch.Tensor], bounds: Tuple[int, int],
+                       begin: int, stop: int, select: Callable[[torch.Tensor], torch.Tensor],
+                       progress_callback: Callable = None, overlap: float = OVERLAP) -> torch.Tensor:
+        """Separa [begin, stop) (samples) com contexto extra em cada borda, dentro de
+        `bounds`, e descarta o contexto; evita artefatos nas bordas do trecho.
+
+        O início é alinhado à grade de segmentos da separação da faixa inteira:
+        com o contexto completo, o trecho sai igual ao da faixa inteira e janelas
+        separadas em pedidos diferentes se emendam sem descontinuidade.
+        """
+        context, stride = self._context_frames(model, overlap)
+        padded_begin = (begin - context) // stride * stride
+        if padded_begin < bounds[0]:
+            padded_begin = bounds[0]
+        padded_stop = min(bounds[1], stop + context)
+
+        def read_padded(offset: int, frames: int) -> torch.Tensor:
+            return read(padded_begin + offset, frames)
+
+        blocks = [block for _, block in self._iter_separated(model, read_padded, padded_stop - padded_begin,
+                                                             select, overlap, progress_callback)]
+        return torch.cat(blocks, dim=-1)[..., begin - padded_begin:stop - padded_begin]
+
+    def _separate_windows(self, model, read: Callable[[int, int], torch.Tensor], bounds: Tuple[int, int],
+                          begin: int, stop: int, select: Callable[[torch.Tensor], torch.Tensor],
+                          progress_callback: Callable, source_id: str, model_name: str,
+                          reaches_end: bool) -> torch.Tensor:
+        """Monta [begin, stop) a partir de janelas de `window_seconds`.
+
+        Janelas ausentes do cache são separadas em sequências contíguas (uma
+        passada por sequência, com contexto nas bordas) e armazenadas com a
+        saída bruta de todas as fontes; os stems são selecionados depois.
+        """
+        sr = model.samplerate
+        window = int(self.window_seconds * sr)
+        context, stride = self._context_frames(model)
+        indices = range(begin // window, (stop - 1) // window + 1)
+        keys = {
+            index: WindowCache.make_key(source_id, model_name, precision=self.model_manager.precision,
+                                        samplerate=sr, window=window, context=context, index=index)
+            for index in indices
+        }
+        windows = {index: self.window_cache.get(keys[index]) for index in indices}
+
+        # Sequências contíguas de janelas ausentes
+        runs = []
+        for index in indices:
+            if windows[index] is not None:
+                continue
+            if runs and runs[-1][-1] == index - 1:
+                runs[-1].append(index)
+            else:
+                runs.append([index])
+
+        def cacheable(index: int) -> bool:
+            # Só janelas com o contexto completo (ou na borda real da faixa) são
+            # iguais às de qualquer outro pedido e podem ir para o cache
+            left = (index * window - context) // stride * stride >= bounds[0] or bounds[0] == 0
+            right = (index + 1) * window + context <= bounds[1] or reaches_end
+            return left and right
+
+        total = sum(min(bounds[1], (run[-1] + 1) * window) - max(bounds[0], run[0] * window) for run in runs)
+        logger.info(f"Trecho em {len(indices)} janela(s): {len(indices) - sum(map(len, runs))} em cache, "
+                    f"{sum(map(len, runs))} a separar")
+        # Início (sample) de cada janela; as calculadas aqui podem começar depois
+        # da borda da janela se o áudio disponível começar no meio dela
+        starts = {index: index * window for index in indices}
+        done = 0
+        for run in runs:
+            run_begin, run_stop = max(bounds[0], run[0] * window), min(bounds[1], (run[-1] + 1) * window)
+            frames = run_stop - run_begin
+
+            def run_progress(percent, details=None, done=done, frames=frames):
+                progress_callback((done + percent / 100 * frames) * 100 / total, details)
+
+            sources = self._separate_span(model, read, bounds, run_begin, run_stop, lambda out: out,
+                                          run_progress if progress_callback else None)
+            for index in run:
+                lo, hi = max(run_begin, index * window), min(run_stop, (index + 1) * window)
+                windows[index], starts[index] = sources[..., lo - run_begin:hi - run_begin], lo
+                if cacheable(index):
+                    self.window_cache.put(keys[index], windows[index].numpy())
+            done += frames
+
+        if not runs and progress_callback:
+            progress_callback(100, None)
+
+        pieces = []
+        for index in indices:
+            piece = select(torch.as_tensor(windows[index]))
+            pieces.append(piece[..., max(begin, starts[index]) - starts[index]:stop - starts[index]])
+        return torch.cat(pieces, dim=-1)
+
+    def _select_outputs(self, sources: torch.Tensor, stems: Optional[List[str]] = None,
+                        two_stems: Optional[str] = None) -> Dict[str, torch.Tensor]:
+        """Seleciona os stems a gravar a partir da saída do modelo [fontes, canais, samples]"""
+        names = stem_names(num_sources=sources.shape[0])
+        if two_stems:
+            # Modo dois stems: alvo e a soma de todo o resto (acompanhamento)
+            target = names.index(two_stems)
+            rest = [i for i in range(len(names)) if i != target]
+            return {
+                two_stems: sources[target],
+                f"no_{two_stems}": sources[rest].sum(dim=0),
+            }
+
+        return {name: sources[names.index(name)] for name in self._output_names(stems, names=names)}
+
+    @staticmethod
+    def _segment_length(model) -> int:
+        """Tamanho (em samples) do segmento de treino do modelo; em bags, o menor deles"""
+        models = getattr(model, 'models', [model])
+        segment = min(float(m.segment) for m in models)
+        return int(model.samplerate * segment)
+
+    def _open_reader(self, audio_path: Union[Path, DecodedAudio],
+                     model) -> Tuple[int, Callable[[int, int], torch.Tensor], Callable[[], None]]:
+        """Abre o áudio para leitura por trechos.
+
+        Retorna (total de samples, read(offset, frames) -> tensor [2, frames], close).
+        Se o arquivo já está na taxa do modelo, lê sob demanda (WAVs via memmap),
+        mantendo a memória limitada; caso contrário carrega e reamostra o áudio inteiro.
+        Áudio já decodificado em memória (DecodedAudio) é lido direto do buffer.
+        """
+
+        if isinstance(audio_path, DecodedAudio):
+            samples = audio_path.samples
+            if audio_path.samplerate == model.samplerate:
+                def read_decoded(offset: int, frames: int) -> torch.Tensor:
+                    return torch.from_numpy(to_stereo_channels_first(samples[offset:offset + frames]))
+
+                return samples.shape[0], read_decoded, lambda: None
+
+            wav = _get_resampler(audio_path.samplerate, model.samplerate)(
+                torch.from_numpy(to_stereo_channels_first(samples))
+            )
+            return wav.shape[-1], lambda offset, frames: wav[:, offset:offset + frames], lambda: None
+
+        mapped = wav_memmap(audio_path)
+        if mapped is not None and mapped[1] == model.samplerate:
+            data = mapped[0]
+
+            def read_mapped(offset: int, frames: int) -> torch.Tensor:
+                return torch.from_numpy(to_stereo_channels_first(data[offset:offset + frames]))
+
+            return data.shape[0], read_mapped, lambda: None
+
+        try:
+            sound_file = sf.SoundFile(str(audio_path))
+        except Exception:
+            sound_file = None
+
+        if sound_file is not None and sound_file.samplerate == model.samplerate:
+            def read(offset: int, frames: int) -> torch.Tensor:
+                sound_file.seek(offset)
+                data = sound_file.read(frames, dtype='float32', always_2d=True)
+                return torch.from_numpy(to_stereo_channels_first(data))
+
+            return sound_file.frames, read, sound_file.close
+
+        if sound_file is not None:
+            sound_file.close()
+        wav = self._load_audio(audio_path, model)
+        return wav.shape[-1], lambda offset, frames: wav[:, offset:offset + frames], lambda: None
+
+    def warm_up(self, model_name: Optional[str] = None) -> float:
+        """Roda um segmento de silêncio pelo modelo (alocações, kernels e caches
+        do primeiro forward) e retorna o tempo gasto em segundos"""
+        model = self.model_manager.get_model(model_name)
+        start = time.time()
+        chunk = torch.zeros(model.audio_channels, self._segment_length(model))
+        self._infer(model, chunk).result()
+        elapsed = time.time() - start
+        logger.info(f"Aquecimento do modelo {model_name or self.model_manager.model_name} concluído em {elapsed:.2f}s")
+        return elapsed
+
+    def _infer(self, model, chunk: torch.Tensor) -> Future:
+        """Processa um segmento [canais, samples] pelo motor em lote ou diretamente"""
+        if self.batch_engine is not None:
+            return self.batch_engine.submit(model, chunk)
+
+        future = Future()
+        device = self.model_manager.device
+        with torch.no_grad(), inference_context(model, device):
+            out = apply_model(
+                model,
+                chunk.unsqueeze(0),
+                device=device,
+                shifts=0,
+                split=False,
+            )
+        future.set_result(out[0].float())
+        return future
+
+    def _iter_separated(self, model, read: Callable[[int, int], torch.Tensor], length: int,
+                        select: Callable[[torch.Tensor], torch.Tensor],
+                        overlap: float = OVERLAP,
+                        progress_callback: Callable = None) -> Iterator[Tuple[int, torch.Tensor]]:
+        """Separa em segmentos sobrepostos com cross-fade, gerando blocos finalizados.
+
+        Usa a mesma janela triangular do apply_model (split=True), mas cada trecho é
+        liberado assim que nenhum segmento posterior contribui mais para ele. Gera
+        (offset, bloco [..., samples]) com a saída de `select` já normalizada.
+        """
+        segment_length = self._segment_length(model)
+        stride = int((1 - overlap) * segment_length)
+        offsets = range(0, length, stride)
+
+        # Janela triangular com máximo no meio do segmento
+        weight = torch.cat([
+            torch.arange(1, segment_length // 2 + 1),
+            torch.arange(segment_length - segment_length // 2, 0, -1),
+        ]).float()
+        weight /= weight.max()
+
+        def submit(offset: int):
+            frames = min(segment_length, length - offset)
+
+            # Segmentos curtos (fim do áudio) são completados com o áudio vizinho,
+            # centralizados como no apply_model, e depois recortados
+            delta = segment_length - frames
+            start = offset - delta // 2
+            real_start, real_end = max(0, start), min(length, start + segment_length)
+            chunk = read(real_start, real_end - real_start)
+            chunk = F.pad(chunk, (real_start - start, start + segment_length - real_end))
+            return frames, delta, self._infer(model, chunk)
+
+        # Com o motor em lote, vários segmentos ficam em voo para formar lotes
+        lookahead = self.batch_engine.max_batch if self.batch_engine else 1
+        pending = deque()
+        next_index = 0
+
+        acc = None
+        sum_weight = torch.zeros(segment_length)
+        progress = SegmentProgress(len(offsets), progress_callback)
+
+        for index, offset in enumerate(offsets):
+            while next_index < len(offsets) and len(pending) < lookahead:
+                pending.append(submit(offsets[next_index]))
+                next_index += 1
+
+            frames, delta, future = pending.popleft()
+            # Só os stems pedidos saem do dispositivo
+            out = select(future.result()[..., delta // 2:delta // 2 + frames]).cpu()
+
+            if acc is None:
+                acc = torch.zeros(out.shape[:-1] + (segment_length,))
+            acc[..., :frames] += weight[:frames] * out
+            sum_weight[:frames] += weight[:frames]
+
+            last = index == len(offsets) - 1
+            ready = frames if last else stride
+            yield offset, acc[..., :ready] / sum_weight[:ready]
+
+            if not last:
+                # Desloca o acumulador para o início do próximo segmento
+                acc = torch.cat([acc[..., stride:], torch.zeros(acc.shape[:-1] + (stride,))], dim=-1)
+                sum_weight = torch.cat([sum_weight[stride:], torch.zeros(stride)])
+
+            progress.advance()
+
+    def separate_stream(self, audio_path: Union[Path, DecodedAudio], stem: str = 'other', progress_callback: Callable = None,
+                        overlap: float = OVERLAP, model_name: Optional[str] = None) -> Iterator[np.ndarray]:
+        """
+        Separa o áudio em segmentos e gera blocos [samples, canais] de um stem
+
+        Cada bloco é entregue assim que fica pronto. `stem` pode ser um dos STEM_NAMES
+        ou 'no_<stem>' para o acompanhamento. `model_name` escolhe o modelo (padrão do ModelManager).
+        """
+        two_stems = stem[3:] if stem.startswith('no_') else None
+        self.validate_stems(None if two_stems else [stem], two_stems, model_name)
+        model = self.model_manager.get_model(model_name)
+
+        def select(sources: torch.Tensor) -> torch.Tensor:
+            outputs = self._select_outputs(sources, [stem] if not two_stems else None, two_stems)
+            return outputs[stem]
+
+        length, read, close = self._open_reader(audio_path, model)
+        try:
+            logger.info(f"Iniciando separação em streaming do stem '{stem}'...")
+            start_time = time.time()
+            # Inclui a espera pelo cliente (contrapressão), por isso uma etapa à parte
+            with track_stage('streaming'):
+                for offset, block in self._iter_separated(model, read, length, select, overlap, progress_callback):
+                    if offset == 0:
+                        logger.info(f"Primeiro bloco pronto em {time.time() - start_time:.2f} segundos")
+                    yield block.numpy().T
+            logger.info(f"Separação em streaming concluída em {time.time() - start_time:.2f} segundos")
+        finally:
+            close()
+
+    def separate(self, audio_path: Union[Path, DecodedAudio], progress_callback: Callable = None,
+                 stems: Optional[List[str]] = None, two_stems: Optional[str] = None,
+                 refine_stem: Optional[str] = None,
+                 refiner: Optional[Callable[[np.ndarray, int, Path], Path]] = None,
+                 output_format: str = 'mp3', bitrate: Optional[int] = None,
+                 model_name: Optional[str] = None, output_dir: Optional[Path] = None,
+                 start: Optional[float] = None, end: Optional[float] = None,
+                 source_id: Optional[str] = None, overlap: float = OVERLAP,
+                 single_pass: bool = False, name_suffix: str = '') -> Dict[str, Path]:
         """
         Separa o áudio em componentes (vocals, drums, bass, other)
+
+        Apenas os stems em `stems` são copiados do dispositivo, codificados e gravados.
+        Com `two_stems`, grava o stem alvo e o acompanhamento `no_<alvo>`.
+        `audio_path` pode ser um arquivo ou um DecodedAudio já em memória.
+        O `progress_callback` recebe (percentual, detalhes) a cada segmento processado.
+
+        Com `refiner`, o stem `refine_stem` vai direto da saída do modelo para
+        `refiner(áudio [samples, canais], sample rate, arquivo de saída)`, sem
+        passar por MP3; o resultado fica em 'vocals_refined'. O arquivo desse stem
+        só é gravado se ele também estiver entre os stems pedidos.
+
+        Os stems são codificados em paralelo no `output_format` (mp3, flac, opus
+        ou npy), com `bitrate` em kbps para mp3/opus. `model_name` escolhe o
+        modelo (carregado sob demanda; padrão do ModelManager). `output_dir` (ex.:
+        o workspace do trabalho) substitui o diretório de saída padrão.
+
+        Com `start`/`end` (segundos), separa só esse trecho da faixa, com
+        `context_seconds` de áudio extra em cada borda. Com o cache de janelas e
+        `source_id` (id estável do áudio, ex.: o id do vídeo), trechos e faixas
+        inteiras reaproveitam as janelas já separadas.
+
+        Para prévias rápidas: `overlap` menor reduz a sobreposição entre
+        segmentos, `single_pass` usa um único modelo do conjunto (bag), o mais forte
+        no stem principal (`two_stems`, `refine_stem` ou o primeiro de `stems`), e
+        `name_suffix` é acrescentado ao nome dos arquivos gravados.
+
+        Exceções levantadas pelos callbacks (ex.: JobCancelled a cada segmento)
+        interrompem a separação; codificações já enfileiradas são canceladas ou
+        aguardadas antes de propagar, para não gravar arquivos depois disso.
         """
+        pending = {}
         try:
-            # Carregar áudio
-            wav = self._load_audio(audio_path)
-            model = self.model_manager.get_model()
-            
-            # Aplicar modelo com captura de progresso
+            self.validate_stems(stems, two_stems, model_name)
+            StemEncoder.validate_format(output_format, bitrate)
+
+            if single_pass:
+                # Em bags especializados, o membro do stem principal pedido
+                target = two_stems or refine_stem or (stems[0] if stems else None)
+                model = self.model_manager.get_single_pass_model(model_name, target)
+            else:
+                model = self.model_manager.get_model(model_name)
+
+            # O stem a refinar precisa ser separado mesmo que não tenha sido pedido
+            selected = stems
+            if refiner and refine_stem and stems and not two_stems and refine_stem not in stems:
+                selected = list(stems) + [refine_stem]
+
             logger.info("Iniciando separação de áudio...")
             start_time = time.time()
-            
-            # Configura captura de progresso
-            progress_capture = DemucsProgressCapture(progress_callback)
-            original_stdout = sys.stdout
-            
-            with torch.no_grad():
-                # Redireciona a saída padrão para capturar o progresso
-                sys.stdout = progress_capture
-                try:
-                    sources = apply_model(
-                        model, 
-                        wav.unsqueeze(0),  # Adiciona dimensão batch [1, 2, samples]
-                        device=self.model_manager.device,
-                        progress=True
-                    )
-                finally:
-                    # Restaura a saída padrão
-                    sys.stdout = original_stdout
-            
+            # Sem o motor em lote, o semáforo limita as inferências simultâneas
+            slots = self._inference_slots if self.batch_engine is None else contextlib.nullcontext()
+            with slots, track_stage('separation'):
+                outputs = self._separate_segmented(model, audio_path, selected, two_stems, progress_callback,
+                                                   start, end, source_id if not single_pass else None,
+                                                   model_name, overlap)
+
             separation_time = time.time() - start_time
             logger.info(f"Separação concluída em {separation_time:.2f} segundos")
             
-            if progress_callback:
-                progress_callback(100)  # 100% após separação completa
-            
-            # Salvar resultados
-            stem_names = ['vocals', 'drums', 'bass', 'other']
+            # Salvar resultados (apenas os stems pedidos), codificados em paralelo
+            base_name = audio_path.name if isinstance(audio_path, DecodedAudio) else Path(audio_path).stem
+            if start is not None or end is not None:
+                base_name += f"_{start or 0:g}-{end:g}s" if end is not None else f"_{start:g}s-fim"
+            base_name += name_suffix
+            output_dir = output_dir or self.output_dir
             result_files = {}
+            to_refine = None
             
-            for i, stem in enumerate(stem_names):
-                output_file = self.output_dir / f"{audio_path.stem}_{stem}.mp3"
-                
+            for stem, stem_audio in outputs.items():
                 # Pega o áudio e converte para [samples, canais] para soundfile
-                audio_data = sources[0, i].cpu().numpy()  # [2, samples]
+                audio_data = stem_audio.cpu().numpy()  # [2, samples]
                 audio_data = audio_data.transpose(1, 0)  # [samples, 2]
-                
-                sf.write(str(output_file), audio_data, model.samplerate)
-                
-                result_files[stem] = output_file
-                logger.info(f"Componente '{stem}' salvo: {output_file}")
+
+                if refiner and stem == refine_stem:
+                    to_refine = (stem, audio_data)
+                    if selected is not stems:
+                        continue
+
+                pending[stem] = self.encoder.submit(
+                    audio_data, model.samplerate, output_dir / f"{base_name}_{stem}",
+                    output_format=output_format, bitrate=bitrate,
+                )
+
+            # O refinamento roda nesta thread enquanto os stems são codificados
+            if to_refine:
+                stem, audio_data = to_refine
+                refined_file = output_dir / f"{base_name}_{stem}_refined.wav"
+                result_files['vocals_refined'] = refiner(audio_data, model.samplerate, refined_file)
+
+            for stem, future in pending.items():
+                result_files[stem] = future.result()
+                logger.info(f"Componente '{stem}' salvo: {result_files[stem]}")
             
             return result_files
             
+        except JobCancelled:
+            self._discard_encodings(pending)
+            logger.info("Separação interrompida: trabalho cancelado")
+            raise
         except Exception as e:
-            # Garante que a saída padrão seja restaurada mesmo em caso de erro
-            if 'original_stdout' in locals():
-                sys.stdout = original_stdout
+            self._discard_encodings(pending)
             logger.error(f"Erro na separação de áudio: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def _discard_encodings(pending: Dict[str, Future]):
+        # Cancela as que não começaram e espera as em andamento terminarem
+        for future in pending.values():
+            future.cancel()
+        wait(pending.values())
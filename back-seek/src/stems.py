@@ -0,0 +1,24 @@
+from typing import List, Optional
+
+# Nomes dos stems na ordem de saída do modelo
+STEM_NAMES = ['vocals', 'drums', 'bass', 'other']
+# Fontes extras dos modelos de 6 stems (htdemucs_6s), depois das quatro acima
+SIX_STEM_EXTRA = ['guitar', 'piano']
+
+
+def stem_names(model_name: Optional[str] = None, num_sources: Optional[int] = None) -> List[str]:
+    """Nomes dos stems de um modelo, pelo nome ou pelo número de fontes"""
+    if num_sources is None:
+        num_sources = 6 if model_name and model_name.endswith('_6s') else 4
+    return STEM_NAMES + SIX_STEM_EXTRA[:max(0, num_sources - len(STEM_NAMES))]
+
+
+def validate_stems(stems: Optional[List[str]] = None, two_stems: Optional[str] = None,
+                   model_name: Optional[str] = None):
+    """Valida os stems pedidos, levantando ValueError para nomes desconhecidos"""
+    names = stem_names(model_name)
+    if two_stems is not None and two_stems not in names:
+        raise ValueError(f"Stem desconhecido: {two_stems}. Opções: {', '.join(names)}")
+    for stem in stems or []:
+        if stem not in names:
+            raise ValueError(f"Stem desconhecido: {stem}. Opções: {', '.join(names)}")
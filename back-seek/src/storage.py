@@ -0,0 +1,214 @@
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator
+from .utils.file_utils import PARTIAL_PREFIX, safe_filename
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class StorageManager:
+    """Diretórios de trabalho por job e ciclo de vida dos arquivos em disco.
+
+    Cada trabalho grava download e stems em `root/<job_id>/`, sem disputar
+    nomes com outros trabalhos. Ao terminar, os arquivos do workspace entram
+    em um índice persistente (tamanho e último acesso); uma thread em segundo
+    plano remove os menos acessados quando o total passa de `max_bytes`.
+    Workspaces de trabalhos em andamento nunca são removidos.
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, root: Path = Path("workspaces"), max_bytes: int = 20 * 1024 ** 3,
+                 interval: float = 60):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._index_path = self.root / self.INDEX_NAME
+        self._artifacts: Dict[str, Dict[str, Any]] = self._load_index()
+        self._active: Dict[str, int] = {}
+        self._evicted = 0
+        self._reconcile()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._evict_loop, name="storage-eviction", daemon=True)
+        self._thread.start()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if not self._index_path.exists():
+            return {}
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Índice de armazenamento corrompido, recriando: {e}")
+            return {}
+
+    def _save_index(self):
+        # Chamado com self._lock adquirido; escrita atômica
+        tmp_path = self._index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._artifacts, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _reconcile(self):
+        """Sincroniza o índice com o disco e remove arquivos parciais de execuções interrompidas"""
+        on_disk = {}
+        for workspace in self.root.iterdir():
+            if not workspace.is_dir():
+                continue
+            for path in workspace.rglob('*'):
+                if not path.is_file():
+                    continue
+                if path.name.startswith(PARTIAL_PREFIX):
+                    path.unlink(missing_ok=True)
+                    continue
+                on_disk[self._relative(path)] = path
+
+        with self._lock:
+            for name in list(self._artifacts):
+                if name not in on_disk:
+                    del self._artifacts[name]
+            for name, path in on_disk.items():
+                if name not in self._artifacts:
+                    stat = path.stat()
+                    self._artifacts[name] = {'size': stat.st_size, 'created': stat.st_mtime,
+                                             'last_access': stat.st_mtime}
+            self._save_index()
+        logger.info(f"Armazenamento: {len(self._artifacts)} arquivo(s), "
+                    f"{self.total_bytes() / 1024 / 1024:.0f} MB em {self.root}")
+
+    def _relative(self, path: Path) -> str:
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def _inside_root(self, path: Path) -> bool:
+        """Se `path` fica dentro de `root` (e não é o próprio root), resolvendo '..' e links"""
+        root = self.root.resolve()
+        return root in Path(path).resolve().parents
+
+    def workspace_path(self, job_id: str) -> Path:
+        path = self.root / safe_filename(job_id)
+        if not self._inside_root(path):
+            raise ValueError(f"Workspace fora de {self.root}: {job_id!r}")
+        return path
+
+    @contextlib.contextmanager
+    def workspace(self, job_id: str) -> Iterator[Path]:
+        """Workspace do trabalho; protegido da remoção até o bloco terminar"""
+        path = self.workspace_path(job_id)
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._active[path.name] = self._active.get(path.name, 0) + 1
+        try:
+            yield path
+        finally:
+            self._index_workspace(path)
+            with self._lock:
+                self._active[path.name] -= 1
+                if not self._active[path.name]:
+                    del self._active[path.name]
+            if self.total_bytes() > self.max_bytes:
+                self.evict()
+
+    def _index_workspace(self, path: Path):
+        now = time.time()
+        with self._lock:
+            for file_path in path.rglob('*'):
+                if not file_path.is_file() or file_path.name.startswith(PARTIAL_PREFIX):
+                    continue
+                name = self._relative(file_path)
+                entry = self._artifacts.get(name)
+                size = file_path.stat().st_size
+                if entry is None:
+                    self._artifacts[name] = {'size': size, 'created': now, 'last_access': now}
+                else:
+                    entry['size'] = size
+            # Arquivos movidos para fora (ex.: para o cache de resultados)
+            prefix = path.name + '/'
+            for name in [n for n in self._artifacts if n.startswith(prefix)]:
+                if not (self.root / name).exists():
+                    del self._artifacts[name]
+            self._save_index()
+
+    def discard(self, path: Path):
+        """Apaga um workspace e seus arquivos (ex.: trabalho cancelado)"""
+        if not self._inside_root(path):
+            logger.error(f"Descarte recusado: {path} não está dentro de {self.root}")
+            raise ValueError(f"Workspace fora de {self.root}: {path}")
+        shutil.rmtree(path, ignore_errors=True)
+        prefix = path.name + '/'
+        with self._lock:
+            for name in [n for n in self._artifacts if n.startswith(prefix)]:
+                del self._artifacts[name]
+            self._save_index()
+        logger.info(f"Workspace descartado: {path}")
+
+    def touch(self, path: Path):
+        """Registra um acesso (ex.: download) para a política de remoção"""
+        try:
+            name = Path(path).absolute().relative_to(self.root.absolute()).as_posix()
+        except ValueError:
+            return
+        with self._lock:
+            entry = self._artifacts.get(name)
+            if entry is not None:
+                entry['last_access'] = time.time()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry['size'] for entry in self._artifacts.values())
+
+    def evict(self) -> int:
+        """Remove arquivos menos acessados de workspaces inativos até caber na cota"""
+        removed = 0
+        with self._lock:
+            total = sum(entry['size'] for entry in self._artifacts.values())
+            if total <= self.max_bytes:
+                return 0
+            for name in sorted(self._artifacts, key=lambda n: self._artifacts[n]['last_access']):
+                if total <= self.max_bytes:
+                    break
+                workspace = name.split('/', 1)[0]
+                if workspace in self._active:
+                    continue
+                if not self._inside_root(self.root / name):
+                    # Entrada que aponta para fora de root: sai do índice, o arquivo fica
+                    total -= self._artifacts.pop(name)['size']
+                    continue
+                (self.root / name).unlink(missing_ok=True)
+                total -= self._artifacts.pop(name)['size']
+                removed += 1
+                # Remove o workspace quando fica vazio
+                workspace_path = self.root / workspace
+                if workspace_path.is_dir() and not any(workspace_path.iterdir()):
+                    shutil.rmtree(workspace_path, ignore_errors=True)
+            self._evicted += removed
+            self._save_index()
+        if removed:
+            logger.info(f"Armazenamento: {removed} arquivo(s) removido(s) para caber na cota")
+        return removed
+
+    def _evict_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.evict()
+            except Exception as e:
+                logger.error(f"Erro na limpeza do armazenamento: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'artifacts': len(self._artifacts),
+                'bytes': sum(entry['size'] for entry in self._artifacts.values()),
+                'max_bytes': self.max_bytes,
+                'active_workspaces': len(self._active),
+                'evicted': self._evicted,
+            }
+
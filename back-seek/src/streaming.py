@@ -0,0 +1,83 @@
+import queue
+import struct
+import time
+from typing import Iterator
+import numpy as np
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_END = object()
+
+
+class StreamClosedError(Exception):
+    """O cliente do stream desconectou ou parou de consumir"""
+
+
+def wav_stream_header(samplerate: int, channels: int = 2, bits: int = 16) -> bytes:
+    """Cabeçalho WAV para stream de tamanho desconhecido (tamanhos 0xFFFFFFFF)"""
+    block_align = channels * bits // 8
+    return b''.join([
+        b'RIFF', struct.pack('<I', 0xFFFFFFFF), b'WAVE',
+        b'fmt ', struct.pack('<IHHIIHH', 16, 1, channels, samplerate, samplerate * block_align, block_align, bits),
+        b'data', struct.pack('<I', 0xFFFFFFFF),
+    ])
+
+
+class StemStream:
+    """Canal entre o worker que separa e a resposta HTTP em chunks.
+
+    O worker chama push() com cada bloco pronto e finish() ao terminar; a
+    resposta HTTP consome iter_bytes(). A fila é limitada: se o cliente parar
+    de ler por mais de `timeout` segundos, o worker recebe StreamClosedError.
+    """
+
+    def __init__(self, samplerate: int, channels: int = 2, max_pending: int = 8, timeout: float = 60):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.timeout = timeout
+        self.closed = False
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def _put(self, item):
+        deadline = time.time() + self.timeout
+        while True:
+            if self.closed:
+                raise StreamClosedError("Cliente desconectou do stream")
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if time.time() > deadline:
+                    self.closed = True
+                    raise StreamClosedError("Cliente parou de consumir o stream")
+
+    def push(self, block: np.ndarray):
+        """Envia um bloco [samples, canais] em float, convertido para PCM 16 bits"""
+        pcm = (np.clip(block, -1.0, 1.0) * 32767).astype('<i2')
+        self._put(pcm.tobytes())
+
+    def finish(self, error: Exception = None):
+        """Sinaliza o fim do stream (com ou sem erro) para o consumidor"""
+        if self.closed:
+            return
+        try:
+            self._put(error if error is not None else _END)
+        except StreamClosedError:
+            pass
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        """Gera o cabeçalho WAV seguido dos blocos PCM à medida que chegam"""
+        try:
+            yield wav_stream_header(self.samplerate, self.channels)
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    logger.error(f"Stream interrompido: {item}")
+                    return
+                yield item
+        finally:
+            # Cliente desconectou ou stream terminou: libera o worker
+            self.closed = True
@@ -0,0 +1,122 @@
+import struct
+from pathlib import Path
+from typing import Optional, Tuple
+import numpy as np
+
+# Subformatos WAV mapeáveis diretamente: (format tag, bits) -> dtype
+_WAV_DTYPES = {
+    (1, 16): np.dtype('<i2'),  # PCM 16 bits
+    (3, 32): np.dtype('<f4'),  # IEEE float 32 bits
+}
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def wav_memmap(path: Path) -> Optional[Tuple[np.ndarray, int]]:
+    """Mapeia em memória os samples de um WAV PCM16 ou float32.
+
+    Retorna (array [samples, canais] somente leitura, sample rate) sem copiar
+    os dados, ou None se o arquivo não for um WAV suportado.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                return None
+
+            fmt = None
+            while True:
+                chunk_header = f.read(8)
+                if len(chunk_header) < 8:
+                    return None
+                chunk_id, chunk_size = chunk_header[:4], struct.unpack('<I', chunk_header[4:])[0]
+
+                if chunk_id == b'fmt ':
+                    body = f.read(chunk_size)
+                    format_tag, channels, samplerate = struct.unpack('<HHI', body[:8])
+                    bits = struct.unpack('<H', body[14:16])[0]
+                    if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        # Os dois primeiros bytes do GUID do subformato são o format tag real
+                        format_tag = struct.unpack('<H', body[24:26])[0]
+                    fmt = (format_tag, channels, samplerate, bits)
+                    if chunk_size % 2:
+                        f.seek(1, 1)
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        return None
+                    format_tag, channels, samplerate, bits = fmt
+                    dtype = _WAV_DTYPES.get((format_tag, bits))
+                    if dtype is None or channels == 0:
+                        return None
+
+                    offset = f.tell()
+                    file_size = Path(path).stat().st_size
+                    # Streams com tamanho desconhecido (0xFFFFFFFF) vão até o fim do arquivo
+                    data_size = min(chunk_size, file_size - offset)
+                    frames = data_size // (dtype.itemsize * channels)
+                    if frames == 0:
+                        return None
+                    data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(frames, channels))
+                    return data, samplerate
+                else:
+                    f.seek(chunk_size + (chunk_size % 2), 1)
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def to_stereo_channels_first(data: np.ndarray) -> np.ndarray:
+    """Converte [samples, canais] (float ou PCM16) em float32 [2, samples] contíguo.
+
+    Faz uma única alocação do tamanho da saída; mono é duplicado e mais de dois
+    canais são reduzidos à média.
+    """
+    frames, channels = data.shape
+    out = np.empty((2, frames), dtype=np.float32)
+
+    if channels == 1:
+        out[0] = data[:, 0]
+        out[1] = out[0]
+    elif channels == 2:
+        out[...] = data.T
+    else:
+        np.mean(data, axis=1, dtype=np.float32, out=out[0])
+        out[1] = out[0]
+
+    if np.issubdtype(data.dtype, np.integer):
+        out *= 1.0 / 32768
+    return out
+
+
+class DecodedAudio:
+    """Áudio já decodificado em memória, pronto para o separador.
+
+    `samples` é float32 [samples, canais] (intercalado, como sai do FFmpeg);
+    `name` é usado para nomear os stems gerados. Um trecho decodificado começa
+    em `start` segundos da faixa original; `end` é o fim pedido (None: até o
+    fim da faixa).
+    """
+
+    def __init__(self, samples: np.ndarray, samplerate: int, name: str,
+                 source_path: Optional[Path] = None, start: float = 0.0,
+                 end: Optional[float] = None):
+        self.samples = samples
+        self.samplerate = samplerate
+        self.name = name
+        self.source_path = source_path
+        self.start = start
+        self.end = end
+        self.wav_path: Optional[Path] = None
+
+    @property
+    def reaches_end(self) -> bool:
+        """Se o áudio vai até o fim da faixa (o FFmpeg entrega menos que o pedido no fim)"""
+        if self.end is None:
+            return True
+        return self.start + self.duration < self.end - 1 / self.samplerate
+
+    @property
+    def duration(self) -> float:
+        return self.samples.shape[0] / self.samplerate
+
+    def __str__(self) -> str:
+        # Em respostas e logs, o áudio é identificado pelo arquivo de origem
+        return str(self.wav_path or self.source_path or self.name)
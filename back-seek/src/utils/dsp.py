@@ -0,0 +1,105 @@
+from typing import Sequence, Tuple
+import numpy as np
+from scipy.signal import lfilter
+
+# Tolerâncias aceitas para o compand por blocos (SNR da diferença, em dB):
+# - em relação ao envelope amostra a amostra do mesmo modelo (tests/test_dsp.py);
+#   ~54 dB no sinal sintético de benchmarks/refiner_parity.py
+COMPAND_MIN_SNR_DB = 40.0
+# - em relação à saída do FFmpeg (benchmarks/refiner_parity.py, requer FFmpeg);
+#   ~53 dB no mesmo sinal, a curva do FFmpeg tem joelho suave
+FFMPEG_PARITY_MIN_SNR_DB = 30.0
+
+
+def _biquad_coefficients(kind: str, freq: float, samplerate: int, q: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Coeficientes (b, a) normalizados de um biquad passa-altas/passa-baixas (RBJ)"""
+    w0 = 2 * np.pi * freq / samplerate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+
+    if kind == 'highpass':
+        b = np.array([(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2])
+    elif kind == 'lowpass':
+        b = np.array([(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2])
+    else:
+        raise ValueError(f"Tipo de filtro desconhecido: {kind}")
+
+    a = np.array([1 + alpha, -2 * cos_w0, 1 - alpha])
+    return b / a[0], a / a[0]
+
+
+def biquad_filter(data: np.ndarray, samplerate: int, kind: str, freq: float, q: float = 0.707) -> np.ndarray:
+    """Aplica um biquad em todos os canais de uma vez (eixo 0 = samples).
+
+    Mesmos coeficientes dos filtros `highpass`/`lowpass` do FFmpeg com
+    largura em Q (padrão 0.707, dois polos).
+    """
+    b, a = _biquad_coefficients(kind, freq, samplerate, q)
+    return lfilter(b, a, data, axis=0)
+
+
+def compand(data: np.ndarray, samplerate: int, attack: float = 0.1, decay: float = 0.3,
+            points: Sequence[Tuple[float, float]] = ((-80, -80), (-30, -10), (0, 0)),
+            block_size: int = 256) -> np.ndarray:
+    """Compressor/expansor por blocos, aproximação do filtro `compand` do FFmpeg.
+
+    O envelope de cada canal segue |x| com constantes de ataque/decaimento em
+    segundos. A atualização amostra a amostra do FFmpeg é somada de uma vez por
+    bloco (vetorizada), comparando cada amostra com o nível do início do bloco;
+    o ganho vem da curva `points` (pares entrada/saída em dB, sem joelho suave)
+    e é interpolado linearmente entre as fronteiras dos blocos.
+
+    Não é bit a bit igual ao FFmpeg: a diferença fica acima de
+    COMPAND_MIN_SNR_DB em relação ao envelope amostra a amostra e de
+    FFMPEG_PARITY_MIN_SNR_DB em relação ao FFmpeg.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    mono = data.ndim == 1
+    if mono:
+        data = data[:, None]
+
+    frames, channels = data.shape
+    if frames == 0:
+        return data[:, 0] if mono else data
+
+    # Coeficientes por amostra, como no FFmpeg
+    attack_coef = 1.0 - np.exp(-1.0 / (samplerate * attack)) if attack > 1.0 / samplerate else 1.0
+    decay_coef = 1.0 - np.exp(-1.0 / (samplerate * decay)) if decay > 1.0 / samplerate else 1.0
+
+    rectified = np.abs(data)
+    blocks = -(-frames // block_size)
+    anchors = np.empty(blocks + 1)
+    envelope = np.empty((blocks + 1, channels))
+
+    # Volume inicial de 0 dB, como no FFmpeg
+    volume = np.ones(channels)
+    anchors[0] = 0
+    envelope[0] = volume
+    for i in range(blocks):
+        start = i * block_size
+        segment = rectified[start:start + block_size]
+        delta = segment - volume
+        volume = volume + (np.where(delta > 0, attack_coef, decay_coef) * delta).sum(axis=0)
+        anchors[i + 1] = start + len(segment) - 1
+        envelope[i + 1] = volume
+
+    # Curva de transferência em dB -> ganho em dB (constante fora dos pontos)
+    points_in = np.array([p[0] for p in points], dtype=np.float64)
+    points_gain = np.array([p[1] - p[0] for p in points], dtype=np.float64)
+    envelope_db = 20 * np.log10(np.maximum(envelope, 1e-12))
+    gain = 10 ** (np.interp(envelope_db, points_in, points_gain) / 20)
+
+    positions = np.arange(frames)
+    out = np.empty_like(data)
+    for ch in range(channels):
+        out[:, ch] = data[:, ch] * np.interp(positions, anchors, gain[:, ch])
+
+    return out[:, 0] if mono else out
+
+
+def vocal_filter_chain(data: np.ndarray, samplerate: int) -> np.ndarray:
+    """highpass=60, lowpass=8500 e compand no mesmo buffer, como a cadeia do FFmpeg"""
+    out = biquad_filter(data, samplerate, 'highpass', 60)
+    out = biquad_filter(out, samplerate, 'lowpass', 8500)
+    out = compand(out, samplerate, attack=0.1, decay=0.3, points=((-80, -80), (-30, -10), (0, 0)))
+    return out.astype(np.float32)
@@ -1,7 +1,12 @@
+import contextlib
 import os
 import re
+import threading
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
+
+# Prefixo dos arquivos ainda sendo gravados (ignorados por índices e limpezas)
+PARTIAL_PREFIX = '.part-'
 
 def safe_filename(filename: str) -> str:
     """Remove caracteres inválidos de nomes de arquivo"""
@@ -16,4 +21,22 @@ def get_audio_files(directory: Path, extensions: List[str] = None) -> List[Path]
     if extensions is None:
         extensions = ['.wav', '.mp3', '.flac', '.m4a']
     
-    return [f for f in directory.iterdir() if f.is_file() and f.suffix.lower() in extensions]
\ No newline at end of file
+    return [f for f in directory.iterdir() if f.is_file() and f.suffix.lower() in extensions]
+
+
+@contextlib.contextmanager
+def atomic_output(path: Path) -> Iterator[Path]:
+    """Caminho temporário no mesmo diretório, renomeado para `path` ao final.
+
+    Leitores nunca veem o arquivo pela metade: ou ele não existe, ou está
+    completo. Em caso de erro, o temporário é removido. A extensão é mantida
+    para quem deduz o formato pelo nome (soundfile, np.save).
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{PARTIAL_PREFIX}{os.getpid()}-{threading.get_ident()}-{path.name}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -4,8 +4,11 @@ import noisereduce as nr
 from pathlib import Path
 from typing import Callable
 from .utils.logger import setup_logger
+from .utils.dsp import vocal_filter_chain
+from .utils.file_utils import atomic_output
+from .metrics import FAILURES, FALLBACKS, STAGE_SECONDS
+from .jobs import JobCancelled
 import subprocess
-import os
 import shutil
 import time
 
@@ -15,12 +18,15 @@ class VocalRefiner:
     """Refina vocais separados para melhor qualidade - VERSÃO RÁPIDA"""
     
     def __init__(self, ffmpeg_path: str = None):
-        self.ffmpeg_path = ffmpeg_path or r"C:\Users\Rennan\tools\ffmpeg-master-latest-win64-gpl\ffmpeg-master-latest-win64-gpl\bin"
+        # Usado apenas por refine_with_ffmpeg (referência para comparação); o
+        # pipeline aplica a mesma cadeia de filtros em memória
+        self.ffmpeg_path = ffmpeg_path
     
     def refine_with_ffmpeg(self, input_path: Path, output_path: Path, progress_callback: Callable = None):
         """Refina vocais usando FFmpeg - VERSÃO RÁPIDA E CONFIÁVEL"""
         try:
-            ffmpeg_exe = os.path.join(self.ffmpeg_path, "ffmpeg.exe")
+            ffmpeg_exe = shutil.which("ffmpeg", path=self.ffmpeg_path) if self.ffmpeg_path else None
+            ffmpeg_exe = ffmpeg_exe or shutil.which("ffmpeg") or "ffmpeg"
             
             # FILTROS SIMPLES, RÁPIDOS E COMPATÍVEIS
             filter_chain = (
@@ -51,49 +57,72 @@ class VocalRefiner:
             logger.error(f"Erro no refinamento FFmpeg: {e}")
             return False
     
-    def refine_with_noisereduce(self, input_path: Path, output_path: Path, progress_callback: Callable = None):
-        """Refina vocais usando noise reduction - VERSÃO CONFIÁVEL"""
+    def reduce_noise(self, data: np.ndarray, sr: int) -> np.ndarray:
+        """Noise reduction em memória; retorna o áudio em mono"""
+        # Garante que é mono
+        if data.ndim > 1:
+            data = data.mean(axis=1)
+
+        # Verifica se o áudio é válido
+        if len(data) < 1024:
+            logger.warning(f"Áudio muito curto ({len(data)} amostras). Pulando noise reduction.")
+            return data
+
         try:
-            # Carrega o áudio
-            data, sr = sf.read(input_path)
-            
-            # Verifica se o áudio é válido
-            if len(data) < 1024:
-                logger.warning(f"Áudio muito curto ({len(data)} amostras). Pulando noise reduction.")
-                sf.write(output_path, data, sr)
-                if progress_callback:
-                    progress_callback(100)  # 100% mesmo pulando
-                return True
-            
-            # Garante que é mono
-            if data.ndim > 1:
-                data = data.mean(axis=1)
-            
-            # Aplica noise reduction
-            reduced_noise = nr.reduce_noise(
-                y=data, 
+            return nr.reduce_noise(
+                y=data,
                 sr=sr,
                 stationary=True,
                 prop_decrease=0.9  # Redução moderada de ruído
             )
-            
-            # Salva o resultado
-            sf.write(output_path, reduced_noise, sr)
-            
-            if progress_callback:
-                progress_callback(100)  # 100% após processamento completo
-            
-            logger.info(f"Noise reduction aplicado: {output_path}")
-            return True
-            
         except Exception as e:
             logger.error(f"Erro no noise reduction: {e}")
-            # Fallback: copia o arquivo original
-            shutil.copy2(input_path, output_path)
-            if progress_callback:
-                progress_callback(100)  # 100% mesmo com fallback
-            return True
-    
+            FALLBACKS.inc(kind='noisereduce')
+            return data
+
+    def refine_array(self, data: np.ndarray, sr: int, progress_callback: Callable = None) -> np.ndarray:
+        """Noise reduction + filtros + compressão sobre um único buffer em memória.
+
+        O `progress_callback` é chamado entre as etapas e pode interrompê-las
+        levantando JobCancelled.
+        """
+        nr_start = time.time()
+        data = self.reduce_noise(data, sr)
+        logger.info(f"✅ Noise reduction concluído em {time.time() - nr_start:.2f}s")
+        if progress_callback:
+            progress_callback(50)
+
+        dsp_start = time.time()
+        data = vocal_filter_chain(data, sr)
+        logger.info(f"✅ Filtros (highpass/lowpass/compand) concluídos em {time.time() - dsp_start:.2f}s")
+        if progress_callback:
+            progress_callback(100)
+        return data
+
+    def refine_to_file(self, data: np.ndarray, sr: int, output_path: Path,
+                       progress_callback: Callable = None) -> Path:
+        """Refina um stem já em memória (ex.: direto do separador) e grava só o resultado"""
+        start_time = time.time()
+        logger.info(f"🚀 Iniciando refinamento em memória: {output_path.name}")
+        try:
+            refined = self.refine_array(data, sr, progress_callback)
+        except JobCancelled:
+            # Cancelado entre as etapas: não grava nada
+            logger.info(f"Refinamento interrompido: trabalho cancelado ({output_path.name})")
+            raise
+        except Exception as e:
+            # Fallback: grava o stem sem refinamento
+            logger.error(f"💥 Erro no refinamento: {e}")
+            FAILURES.inc(stage='refinement')
+            FALLBACKS.inc(kind='unrefined_vocals')
+            refined = data
+        with atomic_output(output_path) as tmp_path:
+            sf.write(str(tmp_path), refined, sr)
+        STAGE_SECONDS.observe(time.time() - start_time, stage='refinement')
+        logger.info(f"🎉 REFINAMENTO CONCLUÍDO! Tempo total: {time.time() - start_time:.2f}s")
+        logger.info(f"📁 Arquivo final: {output_path}")
+        return output_path
+
     def full_refinement_pipeline(self, input_path: Path, output_dir: Path = None, progress_callback: Callable = None):
         """Pipeline completo de refinamento vocal - COM TIMING"""
         start_time = time.time()
@@ -107,51 +136,22 @@ class VocalRefiner:
             output_path = output_dir / f"{stem}_refined.wav"
             
             logger.info(f"🚀 Iniciando refinamento de: {input_path.name}")
-            
-            # Primeiro noise reduction
-            temp_path = output_dir / "temp_refined.wav"
-            
-            nr_start = time.time()
-            if self.refine_with_noisereduce(input_path, temp_path, 
-                                          lambda p: progress_callback(p * 0.5) if progress_callback else None):
-                nr_time = time.time() - nr_start
-                logger.info(f"✅ Noise reduction concluído em {nr_time:.2f}s")
-                
-                # Depois processamento com FFmpeg
-                ffmpeg_start = time.time()
-                if self.refine_with_ffmpeg(temp_path, output_path, 
-                                         lambda p: progress_callback(50 + p * 0.5) if progress_callback else None):
-                    ffmpeg_time = time.time() - ffmpeg_start
-                    logger.info(f"✅ FFmpeg processing concluído em {ffmpeg_time:.2f}s")
-                    
-                    # Remove arquivo temporário
-                    if temp_path.exists():
-                        temp_path.unlink()
-                    
-                    total_time = time.time() - start_time
-                    logger.info(f"🎉 REFINAMENTO CONCLUÍDO! Tempo total: {total_time:.2f}s")
-                    logger.info(f"📁 Arquivo final: {output_path}")
-                    
-                    return output_path
-            
-            # Fallback: copia o original se falhar
-            shutil.copy2(input_path, output_path)
+
+            data, sr = sf.read(str(input_path), dtype='float32')
+            refined = self.refine_array(data, sr, progress_callback)
+            with atomic_output(output_path) as tmp_path:
+                sf.write(str(tmp_path), refined, sr)
+
             total_time = time.time() - start_time
-            logger.warning(f"⚠️  Fallback usado. Tempo total: {total_time:.2f}s")
+            STAGE_SECONDS.observe(total_time, stage='refinement')
+            logger.info(f"🎉 REFINAMENTO CONCLUÍDO! Tempo total: {total_time:.2f}s")
+            logger.info(f"📁 Arquivo final: {output_path}")
             return output_path
             
         except Exception as e:
             total_time = time.time() - start_time
             logger.error(f"💥 Erro no pipeline após {total_time:.2f}s: {e}")
+            FAILURES.inc(stage='refinement')
             # Fallback extremo
+            FALLBACKS.inc(kind='original_vocals')
             return input_path
-
-# Verificação do FFmpeg
-try:
-    ffmpeg_test = os.path.join(r"C:\Users\Rennan\tools\ffmpeg-master-latest-win64-gpl\ffmpeg-master-latest-win64-gpl\bin", "ffmpeg.exe")
-    if os.path.exists(ffmpeg_test):
-        logger.info("✅ FFmpeg encontrado com sucesso!")
-    else:
-        logger.warning("⚠️  FFmpeg não encontrado no caminho especificado")
-except Exception as e:
-    logger.error(f"💥 Erro ao verificar FFmpeg: {e}")
\ No newline at end of file
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+import numpy as np
+from .utils.file_utils import atomic_output
+from .utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class WindowCache:
+    """Cache persistente de janelas separadas, para reaproveitar inferência.
+
+    Cada entrada guarda a saída bruta do modelo (todas as fontes, float32
+    [fontes, canais, samples]) de uma janela de tamanho fixo alinhada ao início
+    da faixa. A chave combina o id do áudio, o modelo, a precisão e a geometria
+    das janelas, então pedidos de trechos sobrepostos (ou da faixa inteira)
+    reaproveitam as janelas já calculadas. Remove as menos usadas quando o total
+    passa de `max_bytes`.
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, cache_dir: Path = Path("window_cache"), max_bytes: int = 4 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index_path = self.cache_dir / self.INDEX_NAME
+        self._entries: Dict[str, Dict[str, Any]] = self._load_index()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(source_id: str, model_name: str, **params) -> str:
+        """Chave da janela a partir do áudio, modelo e parâmetros (ex.: índice da janela)"""
+        payload = json.dumps({'source': source_id, 'model': model_name, 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if not self._index_path.exists():
+            return {}
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Índice do cache de janelas corrompido, recriando: {e}")
+            return {}
+
+    def _save_index(self):
+        # Chamado com self._lock adquirido; escrita atômica
+        tmp_path = self._index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npy"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Janela em cache ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry['last_access'] = time.time()
+        try:
+            window = np.load(self._path(key))
+        except Exception as e:
+            logger.warning(f"Janela em cache ilegível, descartando: {key[:12]} ({e})")
+            with self._lock:
+                self._remove_entry(key)
+                self._save_index()
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return window
+
+    def put(self, key: str, window: np.ndarray):
+        path = self._path(key)
+        with atomic_output(path) as tmp_path:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(window, dtype=np.float32))
+        with self._lock:
+            now = time.time()
+            self._entries[key] = {'size': path.stat().st_size, 'created': now, 'last_access': now}
+            self._evict(keep=key)
+            self._save_index()
+
+    def _remove_entry(self, key: str):
+        if self._entries.pop(key, None) is not None:
+            self._path(key).unlink(missing_ok=True)
+
+    def total_bytes(self) -> int:
+        return sum(entry['size'] for entry in self._entries.values())
+
+    def _evict(self, keep: Optional[str] = None):
+        """Remove as janelas menos usadas recentemente até caber no orçamento de disco"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries[key]['size']
+            self._remove_entry(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'windows': len(self._entries),
+                'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Permite `from src...` rodando o pytest de back-seek/ ou da raiz do repositório
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
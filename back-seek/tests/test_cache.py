@@ -0,0 +1,67 @@
+from pathlib import Path
+from src.cache import ResultCache
+
+KEY = 'k' * 64
+
+
+def _stem(directory: Path, name: str = 'audio_other.mp3', content: bytes = b'stem') -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_bytes(content)
+    return path
+
+
+def test_put_moves_files_and_rewrites_paths(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    src = _stem(tmp_path / 'job')
+    result = cache.put(KEY, {'vocals': str(src)}, {'other': src})
+
+    assert not src.exists()
+    assert Path(result['vocals']).parent == tmp_path / 'cache'
+    assert cache.get(KEY)['vocals'] == result['vocals']
+
+
+def test_put_with_existing_key_keeps_first_result(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    first_src = _stem(tmp_path / 'job_a', content=b'first')
+    second_src = _stem(tmp_path / 'job_b', content=b'second')
+
+    first = cache.put(KEY, {'vocals': str(first_src)}, {'other': first_src})
+    second = cache.put(KEY, {'vocals': str(second_src)}, {'other': second_src})
+
+    # O resultado do primeiro trabalho continua válido; os arquivos novos são descartados
+    assert second == first
+    assert Path(first['vocals']).read_bytes() == b'first'
+    assert not second_src.exists()
+    assert cache.stats()['entries'] == 1
+
+
+def test_put_replaces_invalid_entry_without_touching_other_files(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    first_src = _stem(tmp_path / 'job_a', content=b'first')
+    first = cache.put(KEY, {'vocals': str(first_src)}, {'other': first_src})
+    Path(first['vocals']).write_bytes(b'truncated!!')
+
+    second_src = _stem(tmp_path / 'job_b', content=b'second')
+    second = cache.put(KEY, {'vocals': str(second_src)}, {'other': second_src})
+    assert Path(second['vocals']).read_bytes() == b'second'
+
+
+def test_put_never_overwrites_an_existing_file(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    taken = tmp_path / 'cache' / f"{KEY[:16]}_audio_other.mp3"
+    taken.write_bytes(b'someone else')
+
+    src = _stem(tmp_path / 'job')
+    result = cache.put(KEY, {'vocals': str(src)}, {'other': src})
+    assert taken.read_bytes() == b'someone else'
+    assert Path(result['vocals']) != taken
+
+
+def test_eviction_keeps_the_budget(tmp_path):
+    cache = ResultCache(tmp_path / 'cache', max_bytes=10)
+    for index in range(3):
+        src = _stem(tmp_path / f'job{index}', content=b'x' * 6)
+        cache.put(f'{index}' * 64, {'vocals': str(src)}, {'other': src})
+    assert cache.stats()['entries'] == 1
+    assert cache.get('2' * 64) is not None
@@ -0,0 +1,59 @@
+import pytest
+from flask import Flask
+from src.file_index import FileIndex, download_response
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / 'job').mkdir()
+    (tmp_path / 'job' / 'song_other.mp3').write_bytes(bytes(range(256)) * 4)
+    (tmp_path / 'index.json').write_text('{"secret": true}')
+    (tmp_path / 'index.tmp').write_text('{}')
+    index = FileIndex([tmp_path], rescan_interval=0)
+
+    app = Flask(__name__)
+
+    @app.route('/download/<name>')
+    def download(name):
+        entry = index.resolve(name)
+        if entry is None:
+            return 'not found', 404
+        return download_response(entry, max_age=60)
+
+    return app.test_client(), index
+
+
+def test_index_and_temp_files_are_not_served(client):
+    client, index = client
+    assert index.resolve('index.json') is None
+    assert index.resolve('index.tmp') is None
+    assert client.get('/download/index.json').status_code == 404
+
+
+def test_etag_and_conditional_get(client):
+    client, _ = client
+    first = client.get('/download/song_other.mp3')
+    assert first.status_code == 200 and len(first.data) == 1024
+    etag = first.headers['ETag']
+
+    assert client.get('/download/song_other.mp3', headers={'If-None-Match': etag}).status_code == 304
+    modified = first.headers['Last-Modified']
+    assert client.get('/download/song_other.mp3', headers={'If-Modified-Since': modified}).status_code == 304
+
+
+def test_range_request(client):
+    client, _ = client
+    response = client.get('/download/song_other.mp3', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == bytes(range(10, 20))
+    assert response.headers['Content-Range'] == 'bytes 10-19/1024'
+
+
+def test_registered_files_take_priority_over_scan(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a' / 'x.mp3').write_bytes(b'a')
+    (tmp_path / 'b' / 'x.mp3').write_bytes(b'b')
+    index = FileIndex([tmp_path])
+    index.register(tmp_path / 'b' / 'x.mp3')
+    assert index.resolve('x.mp3').path == (tmp_path / 'b' / 'x.mp3').absolute()
@@ -0,0 +1,81 @@
+import threading
+import pytest
+from src.jobs import Job, JobCancelled, JobQueue, validate_job_id
+
+
+def _blocking_queue(num_workers=1):
+    """Fila cujo handler espera `release` passando por pontos de cancelamento"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def handler(job):
+        started.set()
+        while not release.wait(0.01):
+            job.check_cancelled()
+        return {'params': job.params}
+
+    return JobQueue(handler, num_workers=num_workers), release, started
+
+
+def test_identical_requests_attach_to_the_running_job():
+    jobs, release, started = _blocking_queue()
+    leader, created = jobs.submit({'n': 1}, job_id='a', dedup_key='k')
+    follower, attached_created = jobs.submit({'n': 1}, job_id='b', dedup_key='k')
+
+    assert created and not attached_created
+    assert follower is leader and leader.attached == 1
+    assert jobs.get('b') is leader
+
+    release.set()
+    assert leader.done.wait(5)
+    assert leader.status == Job.COMPLETED
+
+    # Depois de terminar, a mesma chave cria um trabalho novo
+    again, created = jobs.submit({'n': 1}, dedup_key='k')
+    assert created and again is not leader
+
+
+def test_cancel_with_attached_request_only_detaches_it():
+    jobs, release, started = _blocking_queue()
+    leader, _ = jobs.submit({}, job_id='lead', dedup_key='k')
+    jobs.submit({}, job_id='follow', dedup_key='k')
+    assert started.wait(5)
+
+    jobs.cancel('follow')
+    assert leader.attached == 0 and not leader.cancel_requested
+
+    jobs.cancel('lead')
+    assert leader.done.wait(5)
+    assert leader.status == Job.CANCELLED
+
+
+def test_cancel_queued_job_finishes_immediately():
+    jobs, release, started = _blocking_queue(num_workers=1)
+    running, _ = jobs.submit({}, job_id='first')
+    assert started.wait(5)
+    queued, _ = jobs.submit({}, job_id='second')
+
+    jobs.cancel('second')
+    assert queued.done.is_set() and queued.status == Job.CANCELLED
+
+    release.set()
+    assert running.done.wait(5) and running.status == Job.COMPLETED
+    assert jobs.stats()[Job.CANCELLED] == 1
+
+
+def test_cancelled_job_does_not_count_as_failure():
+    assert JobCancelled.counts_as_failure is False
+
+
+@pytest.mark.parametrize('job_id', ['..', '.', 'a/b', 'x' * 65, '', 'a b'])
+def test_unsafe_job_ids_are_rejected(job_id):
+    with pytest.raises(ValueError):
+        validate_job_id(job_id)
+    jobs, _, _ = _blocking_queue()
+    with pytest.raises(ValueError):
+        jobs.submit({}, job_id=job_id)
+
+
+def test_valid_job_ids_are_accepted():
+    validate_job_id(None)
+    validate_job_id('job_01-AB')
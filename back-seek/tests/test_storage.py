@@ -0,0 +1,36 @@
+import pytest
+from src.storage import StorageManager
+
+
+@pytest.fixture
+def storage(tmp_path):
+    manager = StorageManager(tmp_path / 'workspaces', max_bytes=10, interval=3600)
+    yield manager
+    manager._stop.set()
+
+
+def test_workspace_path_stays_inside_root(storage):
+    for job_id in ('..', '.'):
+        with pytest.raises(ValueError):
+            storage.workspace_path(job_id)
+    assert storage.workspace_path('job1').parent == storage.root
+
+
+def test_discard_refuses_paths_outside_root(storage, tmp_path):
+    outside = tmp_path / 'app'
+    outside.mkdir()
+    (outside / 'main.py').write_text('print()')
+    for path in (storage.root / '..', storage.root, outside):
+        with pytest.raises(ValueError):
+            storage.discard(path)
+    assert (outside / 'main.py').exists()
+
+
+def test_evict_skips_active_workspaces(storage):
+    with storage.workspace('active') as active:
+        (active / 'stem.mp3').write_bytes(b'x' * 20)
+        with storage.workspace('done') as done:
+            (done / 'stem.mp3').write_bytes(b'x' * 20)
+        storage.evict()
+        assert (active / 'stem.mp3').exists()
+        assert not (done / 'stem.mp3').exists()